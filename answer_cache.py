@@ -0,0 +1,110 @@
+"""
+Answer cache for VexaAI
+
+Per-replica LRU of assistant answers keyed by the normalized question,
+used to keep answering while the backend is degraded. Answers that may
+depend on who asked are stored under a scope (e.g. the user id) so they
+are only served back to that scope. A snapshot file written by warmup.py
+lets fresh replicas start with a warm cache.
+"""
+
+import json
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+
+_PUNCTUATION = re.compile(r"[^\w\s]")
+_WHITESPACE = re.compile(r"\s+")
+
+
+def normalize_question(question: str) -> str:
+    """Lowercase, strip punctuation and collapse whitespace"""
+    return _WHITESPACE.sub(' ', _PUNCTUATION.sub(' ', question.lower())).strip()
+
+
+def cache_key(question: str, scope: str = None) -> str:
+    key = normalize_question(question)
+    return f"{scope}\x1f{key}" if scope and key else key
+
+
+class AnswerCache:
+    """Thread-safe LRU cache with TTL expiry"""
+
+    def __init__(self, max_entries: int = 1000, ttl: float = 6 * 3600):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()  # key -> (answer, stored_at)
+        self._lock = threading.Lock()
+        self._loaded_mtime = None
+
+    def get(self, question: str, scope: str = None):
+        key = cache_key(question, scope)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry and time.time() - entry[1] < self.ttl:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry[0]
+            if entry:
+                del self._entries[key]
+            self.misses += 1
+            return None
+
+    def set(self, question: str, answer: str, scope: str = None):
+        key = cache_key(question, scope)
+        if not key or not answer:
+            return
+        with self._lock:
+            self._entries[key] = (answer, time.time())
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __contains__(self, question: str):
+        return cache_key(question) in self._entries
+
+    def save(self, path: str):
+        """Write a JSON snapshot of the cache (atomic replace)"""
+        with self._lock:
+            data = {key: list(entry) for key, entry in self._entries.items()}
+        tmp = f"{path}.tmp"
+        with open(tmp, 'w', encoding='utf-8') as f:
+            json.dump(data, f, ensure_ascii=False)
+        os.replace(tmp, path)
+
+    def load(self, path: str) -> int:
+        """Merge a snapshot written by save(); returns the number of fresh entries loaded"""
+        try:
+            mtime = os.path.getmtime(path)
+            with open(path, encoding='utf-8') as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            return 0
+        now = time.time()
+        loaded = 0
+        with self._lock:
+            for key, (answer, stored_at) in data.items():
+                if now - stored_at < self.ttl:
+                    self._entries[key] = (answer, stored_at)
+                    loaded += 1
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+            self._loaded_mtime = mtime
+        return loaded
+
+    def refresh(self, path: str) -> int:
+        """Reload the snapshot if it changed since the last load"""
+        try:
+            mtime = os.path.getmtime(path)
+        except OSError:
+            return 0
+        if mtime == self._loaded_mtime:
+            return 0
+        return self.load(path)
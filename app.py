@@ -8,28 +8,100 @@ import uuid
 from datetime import datetime
 import time
 import os
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
 from dotenv import load_dotenv
 from supabase import create_client, Client
 from auth import require_authentication, show_user_profile
+from session_store import create_session_store, encode_state, store_key
+from circuit_breaker import create_circuit_breaker, log_metrics, OPEN, HALF_OPEN
+from answer_cache import AnswerCache
+from load_balancer import create_load_balancer, parse_webhook_urls
+from profiling import start_rerun, OFF
+from context_window import ContextWindow, add_context, context_budget, context_enabled
+from realtime_delivery import AnswerMailbox, RealtimeListener, fetch_answer, record_content
 
 # Load environment variables
 load_dotenv()
+logging.basicConfig(level=os.getenv("LOG_LEVEL", "INFO"), format="%(asctime)s %(levelname)s %(name)s: %(message)s")
 
-# Config
-WEBHOOK_URL = os.getenv("N8N_WEBHOOK_URL")
+# Config (N8N_WEBHOOK_URLS may list several comma-separated endpoints)
+WEBHOOK_URLS = os.getenv("N8N_WEBHOOK_URLS") or os.getenv("N8N_WEBHOOK_URL")
 SUPABASE_URL = os.getenv("SUPABASE_URL")
 SUPABASE_KEY = os.getenv("SUPABASE_KEY")
+# Snapshot filled by warmup.py; with ANSWER_CACHE_FIRST_TURN=true its context-free answers also
+# serve the first turn of a session (needs a flow that handles record_only, see README)
+ANSWER_CACHE_FILE = os.getenv("ANSWER_CACHE_FILE", "answer_cache.json")
+SERVE_CACHED_FIRST_TURN = os.getenv("ANSWER_CACHE_FIRST_TURN", "false").lower() in ("1", "true", "yes")
+RECORD_QUEUE_LIMIT = int(os.getenv("RECORD_QUEUE_LIMIT", 16))
+# ANSWER_DELIVERY=realtime: the webhook acks with a job id and the reply arrives via Supabase Realtime
+REALTIME_DELIVERY = os.getenv("ANSWER_DELIVERY", "sync").lower() == "realtime"
+REALTIME_URL = os.getenv("REALTIME_URL") or SUPABASE_URL
+REALTIME_TIMEOUT = float(os.getenv("REALTIME_ANSWER_TIMEOUT", 120))
+REALTIME_FALLBACK_SECONDS = float(os.getenv("REALTIME_FALLBACK_SECONDS", 15))
+# Breaker snapshot logged as JSON every N seconds for metrics collection (0 disables)
+CIRCUIT_METRICS_INTERVAL = float(os.getenv("CIRCUIT_METRICS_INTERVAL", 60))
 
 # Supabase client
 supabase: Client = create_client(SUPABASE_URL, SUPABASE_KEY)
 
+# Shared session store (memory://, file:///path or redis://host:6379/0)
+@st.cache_resource
+def get_session_store():
+    return create_session_store()
+
+# Per-replica circuit breaker around the webhook and answer cache for degraded mode
+@st.cache_resource
+def get_circuit_breaker():
+    breaker = create_circuit_breaker()
+    if CIRCUIT_METRICS_INTERVAL > 0:
+        log_metrics(breaker, CIRCUIT_METRICS_INTERVAL)
+    return breaker
+
+@st.cache_resource
+def get_load_balancer():
+    return create_load_balancer(parse_webhook_urls(WEBHOOK_URLS))
+
+# Runtime answers for degraded mode, scoped per user; never loaded from or saved to disk
+@st.cache_resource
+def get_answer_cache():
+    return AnswerCache(max_entries=int(os.getenv("ANSWER_CACHE_SIZE", 1000)))
+
+# Warmed FAQ answers from warmup.py (fresh sessions of a dedicated warm-up user)
+@st.cache_resource
+def get_faq_cache():
+    cache = AnswerCache(max_entries=int(os.getenv("ANSWER_CACHE_SIZE", 1000)))
+    cache.load(ANSWER_CACHE_FILE)
+    return cache
+
+# Background webhook calls that must not hold up the rerun, with a bounded backlog
+@st.cache_resource
+def get_background_executor():
+    return ThreadPoolExecutor(max_workers=4, thread_name_prefix="record-turn")
+
+@st.cache_resource
+def get_record_slots():
+    return threading.BoundedSemaphore(RECORD_QUEUE_LIMIT)
+
+# One Realtime subscription per replica, shared by all sessions
+@st.cache_resource
+def get_answer_mailbox():
+    mailbox = AnswerMailbox(ttl=REALTIME_TIMEOUT * 2)
+    RealtimeListener(REALTIME_URL, SUPABASE_KEY, mailbox).start()
+    return mailbox
+
 # Streamlit page
 st.set_page_config(page_title="VexaAI Assistant", page_icon="🤖", layout="wide")
 
+# Section timings for this rerun; PROFILE_MODE=sample|full also profiles selected reruns
+rerun_profile = start_rerun()
+
 # ----------------------------
 # CSS Styling
 # ----------------------------
-st.markdown("""
+with rerun_profile.section("css"):
+    st.markdown("""
 <style>
     @import url('https://fonts.googleapis.com/css2?family=Inter:wght@400;500;600;700&display=swap');
     * { font-family: 'Inter', sans-serif; }
@@ -120,7 +192,7 @@ st.markdown("""
         border: 1px solid #334155;
     }
 </style>
-""", unsafe_allow_html=True)
+    """, unsafe_allow_html=True)
 
 # ----------------------------
 # Core Logic
@@ -131,7 +203,41 @@ def initialize_session_state():
     if "messages" not in st.session_state:
         st.session_state.messages = []
 
-def display_message(role: str, content: str, timestamp: str = None):
+def restore_session_state(store):
+    """Reload this browser's state from the shared store, once per Streamlit session"""
+    # Older links carried the store key in the URL; drop it so it is not shared further
+    if "sid" in st.query_params:
+        del st.query_params["sid"]
+    # Keyed by the proxy-issued HttpOnly cookie; without it state stays in this session only
+    key = store_key(st.context.cookies)
+    if not key or st.session_state.get("_store_key") == key:
+        return
+    st.session_state._store_key = key
+    state = store.load(key)
+    if state:
+        for name, value in state.items():
+            st.session_state[name] = value
+    st.session_state._store_digest = hash(encode_state(st.session_state))
+
+def persist_session_state(store):
+    """Queue the current state for write-behind, skipping unchanged state"""
+    key = st.session_state.get("_store_key")
+    if not key or not st.session_state.get("authenticated"):
+        return
+    blob = encode_state(st.session_state)
+    if hash(blob) == st.session_state.get("_store_digest"):
+        return
+    store.put(key, blob)
+    st.session_state._store_digest = hash(blob)
+
+def forget_stored_session():
+    """Delete this browser's stored state (on logout)"""
+    key = st.session_state.get("_store_key")
+    if key:
+        get_session_store().delete(key)
+    st.session_state._store_digest = None
+
+def display_message(role: str, content: str, timestamp: str = None, cached: bool = False):
     css_class = "user-message" if role == "user" else "assistant-message"
     time_str = ""
     if timestamp:
@@ -140,6 +246,8 @@ def display_message(role: str, content: str, timestamp: str = None):
             time_str = dt.strftime("%I:%M %p")
         except:
             time_str = ""
+    if cached:
+        time_str = f"{time_str} · saved answer (VexaAI degraded)".lstrip(" ·")
     st.markdown(f"""
     <div class="chat-message {css_class}">
         <div>{content}</div>
@@ -147,24 +255,208 @@ def display_message(role: str, content: str, timestamp: str = None):
     </div>
     """, unsafe_allow_html=True)
 
+def is_first_turn():
+    """True while the message being sent is the only one, i.e. there is no conversation context"""
+    return len(st.session_state.messages) <= 1
+
+def degraded_response(message: str, reason: str, first_turn: bool):
+    """Answer immediately while the backend is unavailable"""
+    # Saved answers are context-free first turns: this user's own, else a warmed FAQ answer
+    cached = None
+    if first_turn:
+        cached = get_answer_cache().get(message, scope=st.session_state.user_id) or get_faq_cache().get(message)
+    if cached:
+        return {"success": True, "degraded": True, "cached": True, "data": {"message": cached}}
+    return {"success": False, "degraded": True, "error": f"{reason} Please try again shortly."}
+
+def get_context_window():
+    """Token-budgeted window of the turns before the message being sent"""
+    window = st.session_state.get("_context_window")
+    if window is None or window.budget != context_budget():
+        window = st.session_state._context_window = ContextWindow(context_budget())
+    return window.sync(st.session_state.messages, upto=len(st.session_state.messages) - 1)
+
+def record_turn(payload: dict, answer: str):
+    """
+    Send a turn answered from the FAQ cache to the webhook in the background,
+    so n8n still stores it in chat memory and chat_messages. Flows that honour
+    `record_only` save `cached_answer` without running the agent.
+    """
+    logger = logging.getLogger(__name__)
+    breaker = get_circuit_breaker()
+    slots = get_record_slots()
+    # Don't add load to a failing backend, and don't let a backlog grow without bound
+    if not slots.acquire(blocking=False):
+        logger.warning("Record queue full, cached turn for session %s not recorded", payload["session_id"])
+        return
+    if not breaker.allow_request():
+        slots.release()
+        logger.warning("Circuit open, cached turn for session %s not recorded", payload["session_id"])
+        return
+
+    payload = dict(payload, cached_answer=answer, record_only=True)
+    balancer = get_load_balancer()
+    timeout = breaker.timeout()
+
+    def _send():
+        start = time.perf_counter()
+        ok = False
+        try:
+            response = balancer.post(payload, timeout=timeout)
+            ok = response.status_code < 500
+        except Exception as e:
+            logger.warning("Could not record cached turn for session %s: %s", payload["session_id"], e)
+        finally:
+            breaker.record(time.perf_counter() - start, ok)
+            slots.release()
+
+    get_background_executor().submit(_send)
+
 def send_message(message: str):
+    first_turn = is_first_turn()
+    cache = get_answer_cache()
+    # A first turn has no conversation context, so a warmed FAQ answer is as good as a fresh one
+    if SERVE_CACHED_FIRST_TURN and first_turn:
+        faq = get_faq_cache()
+        faq.refresh(ANSWER_CACHE_FILE)
+        cached = faq.get(message)
+        if cached:
+            record_turn({"message": message, "session_id": st.session_state.session_id,
+                         "user_id": st.session_state.user_id}, cached)
+            return {"success": True, "data": {"message": cached}}
+
+    breaker = get_circuit_breaker()
+    if not breaker.allow_request():
+        return degraded_response(message, "VexaAI is temporarily unavailable.", first_turn)
+
+    timeout = breaker.timeout()
+    start = time.perf_counter()
+    ok = False
     try:
         payload = {
             "message": message,
             "session_id": st.session_state.session_id,
             "user_id": st.session_state.user_id
         }
-        response = requests.post(WEBHOOK_URL, json=payload, headers={"Content-Type": "application/json"}, timeout=30)
+        if context_enabled():
+            add_context(payload, get_context_window())
+        if REALTIME_DELIVERY:
+            payload["delivery"] = "realtime"
+            # Register before sending so a fast reply cannot be missed
+            get_answer_mailbox().expect(st.session_state.session_id)
+        with rerun_profile.section("network"):
+            response = get_load_balancer().post(payload, timeout=timeout)
         response.raise_for_status()
-        return response.json()
-    except Exception as e:
-        return {"success": False, "error": str(e)}
+        result = response.json()
+        ok = bool(result.get("success"))
+        if ok and REALTIME_DELIVERY and "job_id" in result.get("data", {}):
+            return {"success": True, "pending": True, "job_id": result["data"]["job_id"]}
+        if ok and first_turn:
+            cache.set(message, result["data"]["message"], scope=st.session_state.user_id)
+        return result
+    except requests.exceptions.Timeout:
+        return degraded_response(message, "VexaAI is taking too long to respond.", first_turn)
+    except Exception:
+        return degraded_response(message, "VexaAI could not answer right now.", first_turn)
+    finally:
+        breaker.record(time.perf_counter() - start, ok)
+
+@st.fragment(run_every=1.0)
+def wait_for_answer():
+    """Poll this replica's mailbox for the pending reply without holding the script thread"""
+    pending = st.session_state.get("pending_answer")
+    if not pending:
+        return
+    session_id = st.session_state.session_id
+    mailbox = get_answer_mailbox()
+    mailbox.expect(session_id)
+    record = mailbox.take(session_id, pending["job_id"])
+
+    waited = time.time() - pending["sent_at"]
+    if record is None and waited > REALTIME_FALLBACK_SECONDS and time.time() - pending.get("checked_at", 0) > 5:
+        # Missed event (e.g. reconnected to another replica): look it up directly
+        pending["checked_at"] = time.time()
+        try:
+            record = fetch_answer(supabase, session_id, pending["job_id"], pending["sent_at_iso"])
+        except Exception:
+            record = None
+
+    if record:
+        content = record_content(record)
+        st.session_state.messages.append({"role": "assistant", "content": content, "timestamp": datetime.now().isoformat()})
+        if pending.get("first_turn"):
+            get_answer_cache().set(pending["message"], content, scope=st.session_state.user_id)
+        del st.session_state["pending_answer"]
+        st.rerun()
+    elif waited > REALTIME_TIMEOUT:
+        get_circuit_breaker().record(waited, False)
+        mailbox.forget(session_id)
+        del st.session_state["pending_answer"]
+        st.warning("⏳ VexaAI is taking too long to respond. Please try again shortly.")
+    else:
+        st.markdown('<div class="chat-message assistant-message"><div>🤔 Thinking...</div></div>', unsafe_allow_html=True)
+
+def show_backend_status():
+    """Circuit breaker state and window stats in the sidebar"""
+    status = get_circuit_breaker().snapshot()
+    labels = {OPEN: "🔴 Degraded", HALF_OPEN: "🟡 Recovering"}
+    st.markdown("### 🩺 Backend")
+    st.metric("Status", labels.get(status["state"], "🟢 Healthy"))
+    st.metric("Error rate", f"{status['error_rate'] * 100:.0f}%")
+    st.metric("p99 latency", f"{status['p99_seconds']:.1f}s" if status["p99_seconds"] is not None else "–")
+    st.caption(f"Timeout {status['timeout_seconds']}s · {status['trips']} trips · {status['rejected']} fast-failed")
+    if status["retry_in_seconds"] is not None:
+        st.caption(f"Retrying backend in {status['retry_in_seconds']}s")
+    if REALTIME_DELIVERY:
+        mailbox = get_answer_mailbox().snapshot()
+        st.caption(f"Realtime: {mailbox['waiting_sessions']} waiting · {mailbox['delivered']} delivered")
+    balancer = get_load_balancer().snapshot()
+    if len(balancer["endpoints"]) > 1:
+        with st.expander(f"🔀 Endpoints ({balancer['strategy']})"):
+            for endpoint in balancer["endpoints"]:
+                icon = "🟢" if endpoint["healthy"] else "🔴"
+                p95 = f"{endpoint['p95_ms']:.0f}" if endpoint["p95_ms"] is not None else "–"
+                st.caption(f"{icon} {endpoint['url']}  \n"
+                           f"EWMA {endpoint['ewma_ms']:.0f} ms · p95 {p95} ms · "
+                           f"{endpoint['outstanding']} in flight · {endpoint['errors']}/{endpoint['requests']} errors · "
+                           f"{endpoint['cancelled']} cancelled")
+            if balancer["hedging"]:
+                st.caption(f"Hedged {balancer['hedged']} requests (after {balancer['hedge_delay_ms'] or '–'} ms)")
 
 # ----------------------------
 # Main
 # ----------------------------
 def main():
-    if not require_authentication(supabase):
+    store = get_session_store()
+    with rerun_profile.section("session restore"):
+        restore_session_state(store)
+    try:
+        chat_page()
+    finally:
+        # Also runs when st.rerun() interrupts the script
+        with rerun_profile.section("session persist"):
+            persist_session_state(store)
+        st.session_state._last_rerun_profile = rerun_profile.finish()
+
+def show_profile_panel():
+    """Section breakdown of the previous rerun (debug panel)"""
+    breakdown = st.session_state.get("_last_rerun_profile")
+    with st.expander("🧪 Rerun Profile"):
+        if not breakdown:
+            st.caption("Available from the next rerun")
+            return
+        total = breakdown["total"] or 1
+        for name, ms in sorted(breakdown.items(), key=lambda item: -item[1]):
+            if name == "total":
+                continue
+            st.caption(f"{name}: {ms:.1f} ms")
+            st.progress(min(1.0, ms / total))
+        st.caption(f"Total: {breakdown['total']:.1f} ms · mode {os.getenv('PROFILE_MODE', OFF)}")
+
+def chat_page():
+    with rerun_profile.section("auth"):
+        authenticated = require_authentication(supabase)
+    if not authenticated:
         return
 
     initialize_session_state()
@@ -173,8 +465,8 @@ def main():
     st.markdown('<div class="main-header"><h1>🤖 VexaAI Assistant</h1><p>Your team\'s knowledge — available by chat. (Docs from Google Drive)</p></div>', unsafe_allow_html=True)
 
     # Sidebar
-    with st.sidebar:
-        show_user_profile()
+    with st.sidebar, rerun_profile.section("sidebar"):
+        show_user_profile(on_logout=forget_stored_session)
         st.markdown("### 📊 Knowledge Base")
         stats = {"total": 25, "completed": 22, "processing": 2, "failed": 1}
         st.metric("📚 Total", stats["total"])
@@ -182,6 +474,8 @@ def main():
         st.metric("⏳ Processing", stats["processing"])
         st.metric("❌ Failed", stats["failed"])
         st.markdown("---")
+        show_backend_status()
+        st.markdown("---")
         st.markdown("### ⚙️ Chat Controls")
         if st.button("🔄 New Session", use_container_width=True):
             st.session_state.session_id = str(uuid.uuid4())
@@ -194,19 +488,24 @@ def main():
             st.success("✅ Chat cleared")
             time.sleep(0.5)
             st.rerun()
+        if os.getenv("PROFILE_MODE", OFF).lower() != OFF:
+            show_profile_panel()
 
     # Chat area
-    st.markdown('<div class="chat-container">', unsafe_allow_html=True)
-    if not st.session_state.messages:
-        st.info("👋 Welcome! Start chatting with VexaAI.")
-    else:
-        for msg in st.session_state.messages:
-            display_message(msg["role"], msg["content"], msg.get("timestamp"))
-    st.markdown('</div>', unsafe_allow_html=True)
+    with rerun_profile.section("history render"):
+        st.markdown('<div class="chat-container">', unsafe_allow_html=True)
+        if not st.session_state.messages:
+            st.info("👋 Welcome! Start chatting with VexaAI.")
+        else:
+            for msg in st.session_state.messages:
+                display_message(msg["role"], msg["content"], msg.get("timestamp"), msg.get("cached", False))
+        st.markdown('</div>', unsafe_allow_html=True)
+    if st.session_state.get("pending_answer"):
+        wait_for_answer()
 
     # Input
     st.markdown('<div class="input-container">', unsafe_allow_html=True)
-    with st.form(key="chat_form", clear_on_submit=True):
+    with st.form(key="chat_form", clear_on_submit=True), rerun_profile.section("form"):
         col1, col2 = st.columns([6,1])
         with col1:
             user_input = st.text_input("Message", placeholder="Ask something... 💬", label_visibility="collapsed")
@@ -214,13 +513,29 @@ def main():
             submit = st.form_submit_button("Send 📤", use_container_width=True)
     st.markdown('</div>', unsafe_allow_html=True)
 
-    if submit and user_input:
+    if submit and user_input and st.session_state.get("pending_answer"):
+        st.info("⏳ Please wait for the current answer before sending another message.")
+    elif submit and user_input:
         st.session_state.messages.append({"role": "user", "content": user_input, "timestamp": datetime.now().isoformat()})
         with st.spinner("🤔 Thinking..."):
             resp = send_message(user_input)
-        if resp.get("success"):
-            st.session_state.messages.append({"role": "assistant", "content": resp["data"]["message"], "timestamp": datetime.now().isoformat()})
+        if resp.get("pending"):
+            st.session_state.pending_answer = {
+                "job_id": resp["job_id"],
+                "message": user_input,
+                "first_turn": is_first_turn(),
+                "sent_at": time.time(),
+                "sent_at_iso": datetime.utcnow().isoformat(),
+            }
+            st.rerun()
+        elif resp.get("success"):
+            reply = {"role": "assistant", "content": resp["data"]["message"], "timestamp": datetime.now().isoformat()}
+            if resp.get("cached"):
+                reply["cached"] = True
+            st.session_state.messages.append(reply)
             st.rerun()
+        elif resp.get("degraded"):
+            st.warning(f"⏳ {resp.get('error')}")
         else:
             st.error(f"❌ {resp.get('error')}")
 
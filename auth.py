@@ -99,9 +99,12 @@ def login_user(supabase: Client, username: str, password: str):
         }
 
 
-def logout_user():
-    """Logout user"""
-    keys_to_clear = ['authenticated', 'user_id', 'username', 'email']
+def logout_user(on_logout=None):
+    """Logout user; on_logout is called first, e.g. to delete stored session state"""
+    if on_logout:
+        on_logout()
+    # The conversation belongs to the user who is logging out
+    keys_to_clear = ['authenticated', 'user_id', 'username', 'email', 'messages', 'session_id', 'pending_answer']
     for key in keys_to_clear:
         if key in st.session_state:
             del st.session_state[key]
@@ -354,7 +357,7 @@ def require_authentication(supabase: Client):
     return True
 
 
-def show_user_profile():
+def show_user_profile(on_logout=None):
     """Display user profile in sidebar"""
     if st.session_state.get('authenticated'):
         st.sidebar.markdown("---")
@@ -378,6 +381,6 @@ def show_user_profile():
         """, unsafe_allow_html=True)
         
         if st.sidebar.button("🚪 Logout", use_container_width=True):
-            logout_user()
+            logout_user(on_logout)
             st.success("✅ Logged out successfully!")
             st.rerun()
\ No newline at end of file
@@ -0,0 +1,179 @@
+"""
+Circuit breaker for the n8n webhook
+
+Tracks a rolling window of call outcomes and latencies. When the error
+rate or slow-call rate crosses its threshold the circuit opens and calls
+are rejected immediately; after a cool-down a limited number of probe
+calls are let through (half-open) to decide whether to close again.
+The per-call timeout adapts to the observed p99 latency. State changes
+are logged as they happen and a snapshot can be logged periodically for
+metrics collection.
+"""
+
+import json
+import logging
+import os
+import threading
+import time
+from collections import deque
+
+from latency import percentile
+
+CLOSED = 'closed'
+OPEN = 'open'
+HALF_OPEN = 'half_open'
+
+logger = logging.getLogger(__name__)
+
+
+class CircuitBreaker:
+    """Thread-safe circuit breaker shared by all sessions of a replica"""
+
+    def __init__(self, window: float = 60, min_requests: int = 5, error_threshold: float = 0.5,
+                 slow_call_seconds: float = 20, slow_call_threshold: float = 0.5, open_seconds: float = 30,
+                 half_open_probes: int = 1, min_timeout: float = 5, max_timeout: float = 30,
+                 timeout_multiplier: float = 2.0):
+        self.window = window
+        self.min_requests = min_requests
+        self.error_threshold = error_threshold
+        self.slow_call_seconds = slow_call_seconds
+        self.slow_call_threshold = slow_call_threshold
+        self.open_seconds = open_seconds
+        self.half_open_probes = half_open_probes
+        self.min_timeout = min_timeout
+        self.max_timeout = max_timeout
+        self.timeout_multiplier = timeout_multiplier
+
+        self.state = CLOSED
+        self.opened_at = None
+        self.rejected = 0
+        self.trips = 0
+        self._calls = deque()  # (timestamp, latency_seconds, ok)
+        self._probes = 0
+        self._lock = threading.Lock()
+
+    # ----------------------------
+    # Window bookkeeping
+    # ----------------------------
+    def _trim(self, now: float):
+        while self._calls and self._calls[0][0] < now - self.window:
+            self._calls.popleft()
+
+    def _rates(self):
+        total = len(self._calls)
+        if not total:
+            return 0.0, 0.0
+        errors = sum(1 for _, _, ok in self._calls if not ok)
+        slow = sum(1 for _, latency, _ in self._calls if latency >= self.slow_call_seconds)
+        return errors / total, slow / total
+
+    def _transition(self, state: str, now: float):
+        error_rate, slow_rate = self._rates()
+        logger.warning("circuit %s -> %s (error rate %.2f, slow-call rate %.2f, %d calls in window)",
+                       self.state, state, error_rate, slow_rate, len(self._calls))
+        self.state = state
+        if state == OPEN:
+            self.opened_at = now
+            self.trips += 1
+        self._probes = 0
+
+    # ----------------------------
+    # Public API
+    # ----------------------------
+    def allow_request(self) -> bool:
+        """Return True if a call may go to the backend now"""
+        now = time.monotonic()
+        with self._lock:
+            if self.state == OPEN:
+                if now - self.opened_at < self.open_seconds:
+                    self.rejected += 1
+                    return False
+                self._transition(HALF_OPEN, now)
+            if self.state == HALF_OPEN:
+                if self._probes >= self.half_open_probes:
+                    self.rejected += 1
+                    return False
+                self._probes += 1
+            return True
+
+    def record(self, latency: float, ok: bool):
+        """Record the outcome of a call that allow_request() let through"""
+        now = time.monotonic()
+        with self._lock:
+            if self.state == HALF_OPEN:
+                if ok and latency < self.slow_call_seconds:
+                    # Backend recovered: start from a clean window
+                    self._transition(CLOSED, now)
+                    self._calls.clear()
+                else:
+                    self._transition(OPEN, now)
+                self._calls.append((now, latency, ok))
+                return
+
+            self._calls.append((now, latency, ok))
+            self._trim(now)
+            if self.state == CLOSED and len(self._calls) >= self.min_requests:
+                error_rate, slow_rate = self._rates()
+                if error_rate >= self.error_threshold or slow_rate >= self.slow_call_threshold:
+                    self._transition(OPEN, now)
+
+    def timeout(self) -> float:
+        """Per-call timeout derived from the observed p99 of successful calls"""
+        with self._lock:
+            self._trim(time.monotonic())
+            latencies = [latency for _, latency, ok in self._calls if ok]
+        if len(latencies) < self.min_requests:
+            return self.max_timeout
+        adaptive = percentile(latencies, 99) * self.timeout_multiplier
+        return round(min(self.max_timeout, max(self.min_timeout, adaptive)), 2)
+
+    def snapshot(self) -> dict:
+        """Current state and window statistics for display and metrics"""
+        with self._lock:
+            self._trim(time.monotonic())
+            error_rate, slow_rate = self._rates()
+            latencies = [latency for _, latency, _ in self._calls]
+            snapshot = {
+                'state': self.state,
+                'requests': len(self._calls),
+                'error_rate': round(error_rate, 3),
+                'slow_call_rate': round(slow_rate, 3),
+                'p99_seconds': round(percentile(latencies, 99), 3) if latencies else None,
+                'rejected': self.rejected,
+                'trips': self.trips,
+                'retry_in_seconds': (
+                    max(0.0, round(self.open_seconds - (time.monotonic() - self.opened_at), 1))
+                    if self.state == OPEN else None
+                ),
+            }
+        snapshot['timeout_seconds'] = self.timeout()
+        return snapshot
+
+
+def log_metrics(breaker: CircuitBreaker, interval: float = 60) -> threading.Event:
+    """
+    Log breaker.snapshot() as one JSON line every `interval` seconds from
+    a daemon thread; set the returned event to stop.
+    """
+    stop = threading.Event()
+
+    def _run():
+        while not stop.wait(interval):
+            logger.info("circuit_breaker %s", json.dumps(breaker.snapshot()))
+
+    threading.Thread(target=_run, name='circuit-metrics', daemon=True).start()
+    return stop
+
+
+def create_circuit_breaker() -> CircuitBreaker:
+    """Build a CircuitBreaker configured from CIRCUIT_* environment variables"""
+    return CircuitBreaker(
+        window=float(os.getenv('CIRCUIT_WINDOW_SECONDS', 60)),
+        min_requests=int(os.getenv('CIRCUIT_MIN_REQUESTS', 5)),
+        error_threshold=float(os.getenv('CIRCUIT_ERROR_THRESHOLD', 0.5)),
+        slow_call_seconds=float(os.getenv('CIRCUIT_SLOW_CALL_SECONDS', 20)),
+        slow_call_threshold=float(os.getenv('CIRCUIT_SLOW_CALL_THRESHOLD', 0.5)),
+        open_seconds=float(os.getenv('CIRCUIT_OPEN_SECONDS', 30)),
+        min_timeout=float(os.getenv('CIRCUIT_MIN_TIMEOUT', 5)),
+        max_timeout=float(os.getenv('CIRCUIT_MAX_TIMEOUT', 30)),
+    )
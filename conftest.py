@@ -0,0 +1,144 @@
+"""
+Pytest configuration for the VexaAI webhook regression suite
+
+Runs against the local stand-in by default, or a real endpoint with
+--webhook-url. Every request is timed; at the end of the run the p95 of
+each check is compared against a stored baseline and a JSON report is
+written for trend tracking across releases.
+"""
+
+import os
+import time
+
+import pytest
+import requests
+
+from latency import LatencyRecorder, compare_to_baseline, load_baseline_report, write_report
+from stub_webhook import StubWebhookServer
+
+DEFAULT_BASELINE = 'latency_baseline.json'
+DEFAULT_REPORT = 'latency_report.json'
+
+recorder = LatencyRecorder()
+regressions = []
+baseline_mismatch = []
+
+
+def pytest_addoption(parser):
+    group = parser.getgroup('webhook', 'VexaAI webhook regression suite')
+    group.addoption('--webhook-url', default=os.getenv('WEBHOOK_TEST_URL'),
+                    help='Real webhook endpoint to test (default: local stand-in)')
+    group.addoption('--latency-samples', type=int, default=1,
+                    help='Repeat each chat request this many times for stabler percentiles')
+    group.addoption('--latency-baseline', default=DEFAULT_BASELINE,
+                    help='Stored baseline JSON to compare p95 latencies against')
+    group.addoption('--latency-report', default=DEFAULT_REPORT,
+                    help='Where to write the machine-readable latency report')
+    group.addoption('--p95-threshold', type=float, default=0.20,
+                    help='Allowed p95 regression as a fraction of baseline (default 0.20)')
+    group.addoption('--latency-slack-ms', type=float, default=10.0,
+                    help='Ignore p95 regressions smaller than this many ms (default 10)')
+    group.addoption('--update-baseline', action='store_true',
+                    help='Overwrite the baseline with this run instead of comparing')
+
+
+@pytest.fixture(scope='session')
+def webhook_url(request):
+    """URL of the endpoint under test, starting the local stand-in if none was given"""
+    url = request.config.getoption('--webhook-url')
+    if url:
+        yield url
+        return
+    with StubWebhookServer() as stub:
+        yield stub.url
+
+
+@pytest.fixture
+def latency_samples(request):
+    return max(1, request.config.getoption('--latency-samples'))
+
+
+@pytest.fixture
+def post(request, webhook_url):
+    """POST a payload to the webhook, recording its latency under the test id"""
+
+    def _post(payload: dict, timeout: float = 30):
+        start = time.perf_counter()
+        try:
+            return requests.post(
+                webhook_url,
+                json=payload,
+                headers={"Content-Type": "application/json"},
+                timeout=timeout
+            )
+        finally:
+            recorder.record(request.node.nodeid, (time.perf_counter() - start) * 1000)
+
+    return _post
+
+
+def pytest_sessionfinish(session, exitstatus):
+    if not recorder.samples:
+        return
+
+    config = session.config
+    summary = recorder.summary()
+    metadata = {
+        'target': config.getoption('--webhook-url') or 'local-stub',
+        'p95_threshold': config.getoption('--p95-threshold'),
+        'exit_status': int(exitstatus),
+    }
+    baseline_path = config.getoption('--latency-baseline')
+
+    if config.getoption('--update-baseline'):
+        write_report(baseline_path, summary, metadata=metadata)
+        write_report(config.getoption('--latency-report'), summary, metadata=metadata)
+        return
+
+    baseline_report = load_baseline_report(baseline_path)
+    baseline = baseline_report.get('latency', {})
+    baseline_target = baseline_report.get('metadata', {}).get('target')
+    if baseline and baseline_target != metadata['target']:
+        # Latencies of different endpoints are not comparable
+        baseline_mismatch[:] = [baseline_target]
+        metadata['baseline_skipped'] = f"baseline target {baseline_target!r} != {metadata['target']!r}"
+        baseline = {}
+    regressions[:] = compare_to_baseline(
+        summary,
+        baseline,
+        threshold=config.getoption('--p95-threshold'),
+        slack_ms=config.getoption('--latency-slack-ms')
+    )
+    metadata['baseline'] = baseline_path if baseline else None
+    write_report(config.getoption('--latency-report'), summary, regressions, metadata)
+
+    if regressions and session.exitstatus == 0:
+        session.exitstatus = pytest.ExitCode.TESTS_FAILED
+
+
+def pytest_terminal_summary(terminalreporter, config):
+    if not recorder.samples:
+        return
+
+    terminalreporter.section('webhook latency')
+    for name, stats in recorder.summary().items():
+        terminalreporter.write_line(
+            f"{stats['p50_ms']:9.1f} ms p50 {stats['p95_ms']:9.1f} ms p95  n={stats['count']:<3} {name}"
+        )
+
+    if baseline_mismatch:
+        terminalreporter.write_line(
+            f"⚠️ Baseline comparison skipped: {config.getoption('--latency-baseline')} was recorded against "
+            f"{baseline_mismatch[0]!r}, not {config.getoption('--webhook-url') or 'local-stub'!r} "
+            f"(record one for this target with --update-baseline)",
+            yellow=True
+        )
+    for reg in regressions:
+        terminalreporter.write_line(
+            f"❌ p95 regression: {reg['name']} {reg['baseline_p95_ms']:.1f} ms -> {reg['current_p95_ms']:.1f} ms",
+            red=True
+        )
+    if config.getoption('--update-baseline'):
+        terminalreporter.write_line(f"📌 Baseline updated: {config.getoption('--latency-baseline')}")
+    else:
+        terminalreporter.write_line(f"📝 Report written: {config.getoption('--latency-report')}")
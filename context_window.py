@@ -0,0 +1,168 @@
+"""
+Token-budgeted conversation context for the webhook payload
+
+Keeps a running window of the most recent turns that fits a token
+budget. Token counts are approximated once per message when it enters
+the window, and the running total is updated incrementally, so nothing
+is recounted on later turns. The window is sent as `history` together
+with `history_included: true`, which lets the n8n flow skip its own
+history query; flows that ignore the extra fields keep working.
+
+Benchmark (payload size and latency at 10, 100 and 500 turns):
+    python context_window.py --turns 10 100 500
+"""
+
+import json
+import os
+from collections import deque
+
+MESSAGE_OVERHEAD_TOKENS = 4
+
+
+def approx_tokens(text: str) -> int:
+    """Approximate token count (~4 characters per token) plus per-message overhead"""
+    return (len(text) + 3) // 4 + MESSAGE_OVERHEAD_TOKENS
+
+
+class ContextWindow:
+    """Most recent turns whose approximate token total fits `budget`"""
+
+    def __init__(self, budget: int = 2000):
+        self.budget = budget
+        self.total = 0
+        self.seen = 0  # messages consumed from the conversation so far
+        self._turns = deque()  # (role, content, tokens)
+
+    def append(self, role: str, content: str):
+        tokens = approx_tokens(content)
+        self._turns.append((role, content, tokens))
+        self.total += tokens
+        self.seen += 1
+        while self.total > self.budget and self._turns:
+            self.total -= self._turns.popleft()[2]
+
+    def sync(self, messages: list, upto: int = None):
+        """Catch up with messages[:upto]; rebuilds if the conversation was cleared or replaced"""
+        upto = len(messages) if upto is None else upto
+        if upto < self.seen:
+            self.clear()
+        for msg in messages[self.seen:upto]:
+            self.append(msg["role"], msg["content"])
+        return self
+
+    def clear(self):
+        self._turns.clear()
+        self.total = 0
+        self.seen = 0
+
+    def __len__(self):
+        return len(self._turns)
+
+    def to_payload(self) -> list:
+        return [{"role": role, "content": content} for role, content, _ in self._turns]
+
+
+def context_enabled() -> bool:
+    return os.getenv("CONTEXT_WINDOW", "false").lower() in ("1", "true", "yes")
+
+
+def context_budget() -> int:
+    return int(os.getenv("CONTEXT_TOKEN_BUDGET", 2000))
+
+
+def add_context(payload: dict, window: ContextWindow) -> dict:
+    """Attach the window to a webhook payload"""
+    payload["history"] = window.to_payload()
+    payload["history_included"] = True
+    return payload
+
+
+# ----------------------------
+# Benchmark
+# ----------------------------
+def benchmark(url: str, turn_counts, budget: int = 2000, samples: int = 5) -> list:
+    """
+    For each conversation length, prime one session to that many turns,
+    then time further turns with and without the client-side window and
+    record the request payload size.
+    """
+    import time
+    import uuid
+
+    import requests
+
+    from latency import summarize
+    from webhook import PROMPTS, make_payload
+
+    results = []
+    with requests.Session() as http:
+        for turns in turn_counts:
+            session_id = str(uuid.uuid4())
+            messages = []
+            print(f"  priming a {turns}-turn session...")
+            for i in range(turns):
+                question = f"{PROMPTS[i % len(PROMPTS)]} (turn {i + 1})"
+                # Priming turns skip the server-side history load so they stay cheap
+                prime = add_context(make_payload(question, session_id, "bench"), ContextWindow(0))
+                answer = http.post(url, json=prime, timeout=120).json()["data"]["message"]
+                messages += [{"role": "user", "content": question}, {"role": "assistant", "content": answer}]
+
+            latencies = {False: [], True: []}
+            payload_bytes = {}
+            for _ in range(samples):
+                for with_window in (False, True):
+                    payload = make_payload("What is VexaAI?", session_id, "bench")
+                    if with_window:
+                        add_context(payload, ContextWindow(budget).sync(messages))
+                    body = json.dumps(payload).encode()
+                    payload_bytes[with_window] = len(body)
+                    start = time.perf_counter()
+                    http.post(url, data=body, headers={"Content-Type": "application/json"}, timeout=120)
+                    latencies[with_window].append((time.perf_counter() - start) * 1000)
+
+            for with_window in (False, True):
+                stats = summarize(latencies[with_window])
+                results.append({
+                    'turns': turns,
+                    'context_window': with_window,
+                    'payload_bytes': payload_bytes[with_window],
+                    'p50_ms': stats['p50_ms'],
+                    'p95_ms': stats['p95_ms'],
+                })
+                label = "client window" if with_window else "server history"
+                print(f"  {turns:>4} turns  {label:<14}  payload {payload_bytes[with_window]:>7,} B  "
+                      f"p50 {stats['p50_ms']:8.1f} ms  p95 {stats['p95_ms']:8.1f} ms")
+    return results
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description='Benchmark the client-side context window')
+    parser.add_argument('--webhook-url', default=os.getenv('WEBHOOK_TEST_URL'),
+                        help='Endpoint to benchmark (default: local stand-in)')
+    parser.add_argument('--turns', type=int, nargs='+', default=[10, 100, 500])
+    parser.add_argument('--budget', type=int, default=context_budget())
+    parser.add_argument('--samples', type=int, default=5)
+    parser.add_argument('--stub-history-latency', type=float, default=0.0005,
+                        help='Local stand-in only: extra seconds per stored turn when history is loaded server-side')
+    parser.add_argument('--report', default=None)
+    args = parser.parse_args()
+
+    stub = None
+    url = args.webhook_url
+    if not url:
+        from stub_webhook import StubWebhookServer
+        stub = StubWebhookServer(history_latency=args.stub_history_latency).start()
+        url = stub.url
+
+    print(f"📏 Context window benchmark against {url} (budget {args.budget} tokens)")
+    try:
+        results = benchmark(url, args.turns, budget=args.budget, samples=args.samples)
+    finally:
+        if stub:
+            stub.stop()
+    if args.report:
+        with open(args.report, 'w') as f:
+            json.dump(results, f, indent=2)
+        print(f"📝 Report written: {args.report}")
@@ -0,0 +1,520 @@
+"""
+Near-duplicate chunk detection for the document pipeline
+
+Runs between chunking and embedding. MinHash signatures over word
+shingles are computed in vectorized numpy batches; an LSH banding index
+finds candidate matches, which are confirmed by estimated Jaccard
+similarity. Duplicates are either dropped (skip) or passed on with a
+`duplicate_of` link instead of being embedded. The index is saved
+between runs so copies spread across Drive syncs are caught too.
+Chunks of a deleted or re-chunked document are removed by id; the
+duplicates that pointed at them are handed back to be embedded.
+
+Usage (chunks as JSONL with "id" and "text" on stdin):
+    python dedup.py filter --index dedup_index.npz < chunks.jsonl > to_embed.jsonl
+    python dedup.py filter --mode link --report dedup_report.json < chunks.jsonl
+    python dedup.py remove --index dedup_index.npz --prefix <doc_id>:
+    python dedup.py bench --chunks 1000000
+"""
+
+import argparse
+import json
+import re
+import sys
+import time
+import zlib
+from itertools import chain
+
+import numpy as np
+
+NUM_PERM = 64
+BANDS = 16
+SHINGLE_SIZE = 3
+THRESHOLD = 0.8
+BATCH_SIZE = 1024
+EMBEDDING_DIM = 768
+
+_WORD = re.compile(r"\w+")
+_SHINGLE_BASE = np.uint64(1_000_003)
+_MAX_HASH = np.uint32(0xFFFFFFFF)
+
+
+# ----------------------------
+# MinHash
+# ----------------------------
+class MinHasher:
+    """MinHash over word shingles using multiply-shift hashing on uint64"""
+
+    def __init__(self, num_perm: int = NUM_PERM, shingle_size: int = SHINGLE_SIZE, seed: int = 1):
+        rng = np.random.default_rng(seed)
+        self.num_perm = num_perm
+        self.shingle_size = shingle_size
+        self.a = rng.integers(1, 2**63, size=num_perm, dtype=np.uint64) | np.uint64(1)
+        self.b = rng.integers(0, 2**63, size=num_perm, dtype=np.uint64)
+        self._word_cache = {}
+
+    def _word_hashes(self, words: list) -> np.ndarray:
+        cache = self._word_cache
+        missing = set(words).difference(cache)
+        if len(cache) + len(missing) > 1_000_000:
+            cache.clear()
+            missing = set(words)
+        cache.update((w, zlib.crc32(w.encode())) for w in missing)
+        return np.fromiter(map(cache.__getitem__, words), dtype=np.uint64, count=len(words))
+
+    def shingles(self, texts) -> tuple:
+        """
+        32-bit hashes of the word k-grams of every text in the batch,
+        concatenated, plus each text's offset into them. Texts shorter
+        than k words get a single shingle so every text has at least one.
+        """
+        k = self.shingle_size
+        tokens = [_WORD.findall(text.lower()) for text in texts]
+        counts = np.fromiter(map(len, tokens), dtype=np.int64, count=len(tokens))
+        words = self._word_hashes(list(chain.from_iterable(tokens)))
+        starts = np.concatenate(([0], np.cumsum(counts)[:-1]))
+
+        windows = np.maximum(counts - k + 1, 0)
+        sizes = np.maximum(windows, 1)
+        offsets = np.concatenate(([0], np.cumsum(sizes)[:-1]))
+
+        # Window start positions in `words`, laid out text by text
+        first = np.repeat(starts, windows)
+        within = np.arange(len(first)) - np.repeat(np.cumsum(windows) - windows, windows)
+        positions = first + within
+        combined = np.zeros(len(positions), dtype=np.uint64)
+        for j in range(k):
+            combined = combined * _SHINGLE_BASE + words[positions + j]
+
+        values = np.empty(int(sizes.sum()), dtype=np.uint64)
+        long_texts = windows > 0
+        values[np.repeat(long_texts, sizes)] = combined
+        for i in np.flatnonzero(~long_texts):
+            values[offsets[i]] = words[starts[i]:starts[i] + counts[i]].sum()
+        return values & np.uint64(0xFFFFFFFF), offsets
+
+    def signatures(self, texts) -> np.ndarray:
+        """(len(texts), num_perm) uint32 MinHash signatures for a batch"""
+        values, offsets = self.shingles(texts)
+        # (num_perm, total_shingles): h(x) = (a*x + b) >> 32, wrapping in uint64
+        hashed = (self.a[:, None] * values[None, :] + self.b[:, None]) >> np.uint64(32)
+        return np.minimum.reduceat(hashed, offsets, axis=1).T.astype(np.uint32)
+
+
+# ----------------------------
+# LSH index
+# ----------------------------
+class LSHIndex:
+    """
+    Banded LSH over MinHash signatures of unique chunks.
+
+    Band keys live in sorted numpy segments searched with searchsorted,
+    which keeps memory at a few dozen bytes per band per chunk even at
+    millions of chunks.
+    """
+
+    max_segments = 8
+
+    def __init__(self, num_perm: int = NUM_PERM, bands: int = BANDS, threshold: float = THRESHOLD, seed: int = 2):
+        if num_perm % bands:
+            raise ValueError("num_perm must be divisible by bands")
+        rng = np.random.default_rng(seed)
+        self.num_perm = num_perm
+        self.bands = bands
+        self.rows = num_perm // bands
+        self.threshold = threshold
+        self._row_mult = rng.integers(1, 2**63, size=self.rows, dtype=np.uint64) | np.uint64(1)
+        self._band_salt = rng.integers(0, 2**63, size=bands, dtype=np.uint64)
+        self._segments = []  # (sorted keys, ids)
+        self._signatures = np.empty((0, num_perm), dtype=np.uint32)
+        self.size = 0
+        self.labels = []
+        self._ids_by_label = {}
+        self._removed = set()
+        self._duplicate_of = {}  # label -> (original label, similarity, signature digest)
+        self.orphaned = []  # duplicates whose original was replaced; they must be sent again
+
+    def band_keys(self, signatures: np.ndarray) -> np.ndarray:
+        """(n, bands) uint64 keys; equal keys mean the band's rows all match"""
+        n = len(signatures)
+        banded = signatures.reshape(n, self.bands, self.rows).astype(np.uint64)
+        return (banded * self._row_mult).sum(axis=2, dtype=np.uint64) ^ self._band_salt
+
+    def _append_signatures(self, signatures: np.ndarray):
+        needed = self.size + len(signatures)
+        if needed > len(self._signatures):
+            grown = np.empty((max(needed, 2 * len(self._signatures), 1024), self.num_perm), dtype=np.uint32)
+            grown[:self.size] = self._signatures[:self.size]
+            self._signatures = grown
+        self._signatures[self.size:needed] = signatures
+        self.size = needed
+
+    def _add_segment(self, keys: np.ndarray, ids: np.ndarray):
+        order = np.argsort(keys, kind='stable')
+        self._segments.append((keys[order], ids[order]))
+        if len(self._segments) > self.max_segments:
+            all_keys = np.concatenate([k for k, _ in self._segments])
+            all_ids = np.concatenate([i for _, i in self._segments])
+            order = np.argsort(all_keys, kind='stable')
+            self._segments = [(all_keys[order], all_ids[order])]
+
+    @staticmethod
+    def _digest(signature: np.ndarray) -> int:
+        return zlib.crc32(signature.tobytes())
+
+    def _lookup(self, keys: np.ndarray) -> np.ndarray:
+        """Representative id for each key from the stored segments, -1 where none"""
+        flat = keys.ravel()
+        found = np.full(len(flat), -1, dtype=np.int64)
+        for seg_keys, seg_ids in self._segments:
+            pos = np.minimum(np.searchsorted(seg_keys, flat), len(seg_keys) - 1)
+            hit = (seg_keys[pos] == flat) & (found < 0)
+            found[hit] = seg_ids[pos[hit]]
+        return found.reshape(keys.shape)
+
+    def add_batch(self, signatures: np.ndarray, labels) -> list:
+        """
+        Check each signature against the index (and earlier ones in the
+        batch); unique ones are inserted. Returns (duplicate_of_label,
+        similarity, already_indexed) per chunk, with None for unique chunks.
+
+        A label seen before with the same signature is reported as
+        already indexed (with its duplicate_of link, if it was a
+        duplicate), not as a duplicate of itself. If its text changed, the
+        old entry is removed and the chunk is checked again; duplicates of
+        it go to `orphaned`. A label repeated within the batch gets its
+        first result.
+        """
+        labels = list(labels)
+        first_row = {}
+        unchanged = {}
+        changed = []
+        for i, label in enumerate(labels):
+            if label in first_row:
+                if not np.array_equal(signatures[i], signatures[first_row[label]]):
+                    raise ValueError(f"Label {label!r} appears twice in one batch with different text")
+                continue
+            first_row[label] = i
+            old = self._ids_by_label.get(label)
+            if old is not None:
+                if np.array_equal(self._signatures[old], signatures[i]):
+                    unchanged[i] = (None, 1.0, True)
+                else:
+                    changed.append(label)
+            elif label in self._duplicate_of:
+                original, similarity, digest = self._duplicate_of[label]
+                if digest == self._digest(signatures[i]) and original in self._ids_by_label:
+                    unchanged[i] = (original, similarity, True)
+                else:
+                    del self._duplicate_of[label]
+        self.orphaned += self.remove(changed)
+
+        keys = self.band_keys(signatures)
+        stored = self._lookup(keys)
+        local = {}
+        unique_rows = []
+        results = []
+
+        for i, label in enumerate(labels):
+            if first_row[label] != i:
+                results.append(results[first_row[label]])
+                continue
+            if i in unchanged:
+                results.append(unchanged[i])
+                continue
+
+            candidates = {int(c) for c in stored[i] if c >= 0}
+            candidates.update(local[k] for k in keys[i].tolist() if k in local)
+
+            best, best_sim = None, 0.0
+            if candidates:
+                cand = np.fromiter(candidates, dtype=np.int64)
+                sims = (self._candidate_signatures(cand, signatures, unique_rows) == signatures[i]).mean(axis=1)
+                j = int(sims.argmax())
+                best, best_sim = int(cand[j]), float(sims[j])
+
+            if best is not None and best_sim >= self.threshold:
+                duplicate = (self.labels[best], round(best_sim, 3))
+                self._duplicate_of[label] = duplicate + (self._digest(signatures[i]),)
+                results.append(duplicate + (False,))
+                continue
+
+            new_id = self.size + len(unique_rows)
+            unique_rows.append(i)
+            self.labels.append(label)
+            self._ids_by_label[label] = new_id
+            for k in keys[i].tolist():
+                local.setdefault(k, new_id)
+            results.append((None, round(best_sim, 3), False))
+
+        if unique_rows:
+            rows = np.array(unique_rows, dtype=np.int64)
+            ids = np.arange(self.size, self.size + len(rows), dtype=np.int64)
+            self._append_signatures(signatures[rows])
+            self._add_segment(keys[rows].ravel(), np.repeat(ids, self.bands))
+        return results
+
+    def remove(self, labels) -> list:
+        """
+        Forget the chunks with these labels, e.g. those of a deleted or
+        re-chunked document. Their band keys are dropped, so later copies
+        are treated as new again.
+
+        Returns the duplicates that were linked to a removed chunk. They
+        were never embedded, so they are forgotten as well and must be
+        sent through the pipeline again.
+        """
+        labels = set(labels)
+        for label in labels:
+            self._duplicate_of.pop(label, None)
+        removed = labels & self._ids_by_label.keys()
+        ids = [self._ids_by_label.pop(label) for label in removed]
+        if not ids:
+            return []
+        orphaned = [dup for dup, (original, _, _) in self._duplicate_of.items() if original in removed]
+        for dup in orphaned:
+            del self._duplicate_of[dup]
+        self._removed.update(ids)
+        all_keys = np.concatenate([k for k, _ in self._segments])
+        all_ids = np.concatenate([i for _, i in self._segments])
+        keep = ~np.isin(all_ids, ids)
+        self._segments = []
+        if keep.any():
+            self._add_segment(all_keys[keep], all_ids[keep])
+        return orphaned
+
+    def labels_with_prefix(self, prefix: str) -> list:
+        return [label for label in chain(self._ids_by_label, self._duplicate_of) if label.startswith(prefix)]
+
+    def __contains__(self, label) -> bool:
+        return label in self._ids_by_label or label in self._duplicate_of
+
+    def _candidate_signatures(self, cand: np.ndarray, batch: np.ndarray, unique_rows: list) -> np.ndarray:
+        # Candidates from this batch are not in self._signatures yet
+        out = np.empty((len(cand), self.num_perm), dtype=np.uint32)
+        stored = cand < self.size
+        out[stored] = self._signatures[cand[stored]]
+        for n, c in enumerate(cand):
+            if c >= self.size:
+                out[n] = batch[unique_rows[c - self.size]]
+        return out
+
+    def nbytes(self) -> int:
+        return self._signatures[:self.size].nbytes + sum(k.nbytes + i.nbytes for k, i in self._segments)
+
+    def save(self, path: str):
+        keys = np.concatenate([k for k, _ in self._segments]) if self._segments else np.empty(0, np.uint64)
+        ids = np.concatenate([i for _, i in self._segments]) if self._segments else np.empty(0, np.int64)
+        np.savez_compressed(
+            path, keys=keys, ids=ids, signatures=self._signatures[:self.size],
+            labels=np.array(self.labels, dtype=str),
+            removed=np.array(sorted(self._removed), dtype=np.int64),
+            duplicate_labels=np.array(list(self._duplicate_of), dtype=str),
+            duplicate_of=np.array([d[0] for d in self._duplicate_of.values()], dtype=str),
+            duplicate_similarity=np.array([d[1] for d in self._duplicate_of.values()], dtype=np.float64),
+            duplicate_digest=np.array([d[2] for d in self._duplicate_of.values()], dtype=np.uint32),
+            params=np.array([self.num_perm, self.bands, self.threshold], dtype=np.float64),
+        )
+
+    @classmethod
+    def load(cls, path: str) -> 'LSHIndex':
+        data = np.load(path)
+        num_perm, bands, threshold = data['params']
+        index = cls(int(num_perm), int(bands), float(threshold))
+        index._signatures = data['signatures']
+        index.size = len(index._signatures)
+        index.labels = data['labels'].tolist()
+        index._removed = set(data['removed'].tolist()) if 'removed' in data.files else set()
+        # Later entries win: a changed chunk is re-inserted under its old label
+        index._ids_by_label = {label: i for i, label in enumerate(index.labels) if i not in index._removed}
+        if 'duplicate_labels' in data.files:
+            index._duplicate_of = {
+                label: (original, float(similarity), int(digest)) for label, original, similarity, digest in zip(
+                    data['duplicate_labels'].tolist(), data['duplicate_of'].tolist(),
+                    data['duplicate_similarity'], data['duplicate_digest'])
+            }
+        if len(data['keys']):
+            index._add_segment(data['keys'], data['ids'])
+        return index
+
+
+# ----------------------------
+# Pipeline stage
+# ----------------------------
+class Deduplicator:
+    """Batch chunks through MinHash + LSH and keep savings statistics"""
+
+    def __init__(self, index: LSHIndex = None, hasher: MinHasher = None, embedding_dim: int = EMBEDDING_DIM):
+        self.index = index or LSHIndex()
+        self.hasher = hasher or MinHasher(self.index.num_perm)
+        self.embedding_dim = embedding_dim
+        self.chunks = 0
+        self.duplicates = 0
+        self.already_indexed = 0
+        self.bytes_skipped = 0
+        self.seconds = 0.0
+
+    def process(self, chunks: list) -> list:
+        """Annotate chunk dicts ({'id', 'text', ...}) with duplicate_of, similarity and already_indexed"""
+        start = time.perf_counter()
+        signatures = self.hasher.signatures([c['text'] for c in chunks])
+        results = self.index.add_batch(signatures, [str(c['id']) for c in chunks])
+        self.seconds += time.perf_counter() - start
+
+        for chunk, (duplicate_of, similarity, already_indexed) in zip(chunks, results):
+            chunk['duplicate_of'] = duplicate_of
+            chunk['similarity'] = similarity
+            chunk['already_indexed'] = already_indexed
+            if already_indexed:
+                self.already_indexed += 1
+            elif duplicate_of is not None:
+                self.duplicates += 1
+                self.bytes_skipped += len(chunk['text'].encode())
+        self.chunks += len(chunks)
+        return chunks
+
+    def report(self) -> dict:
+        return {
+            'chunks': self.chunks,
+            'unique': self.chunks - self.duplicates - self.already_indexed,
+            'duplicates': self.duplicates,
+            'already_indexed': self.already_indexed,
+            'duplicate_rate': round(self.duplicates / self.chunks, 4) if self.chunks else 0.0,
+            'embedding_calls_saved': self.duplicates,
+            'text_bytes_saved': self.bytes_skipped,
+            'vector_bytes_saved': self.duplicates * self.embedding_dim * 4,
+            'overhead_us_per_chunk': round(self.seconds / self.chunks * 1e6, 1) if self.chunks else 0.0,
+            'index_bytes': self.index.nbytes(),
+        }
+
+
+def _read_batches(stream, size: int):
+    batch = []
+    for line in stream:
+        if line.strip():
+            batch.append(json.loads(line))
+            if len(batch) >= size:
+                yield batch
+                batch = []
+    if batch:
+        yield batch
+
+
+def _write_resend(labels):
+    """Ask the pipeline to send these chunks again: they were skipped as duplicates of a removed chunk"""
+    for label in labels:
+        sys.stdout.write(json.dumps({'id': label, 'action': 'resend'}) + '\n')
+
+
+def synthetic_chunks(count: int, duplicate_rate: float = 0.2, words: int = 120, seed: int = 0):
+    """Yield chunks where a share are near-copies (a few words changed) of earlier ones"""
+    rng = np.random.default_rng(seed)
+    vocabulary = np.array([f"w{i}" for i in range(50_000)])
+    originals = []
+    for i in range(count):
+        if originals and rng.random() < duplicate_rate:
+            source_id, tokens = originals[rng.integers(len(originals))]
+            tokens = tokens.copy()
+            edits = rng.integers(0, len(tokens), size=2)
+            tokens[edits] = vocabulary[rng.integers(len(vocabulary), size=2)]
+            yield {'id': f"c{i}", 'text': ' '.join(tokens), 'expected_duplicate_of': source_id}
+        else:
+            tokens = vocabulary[rng.integers(len(vocabulary), size=words)]
+            if len(originals) < 10_000:
+                originals.append((f"c{i}", tokens))
+            yield {'id': f"c{i}", 'text': ' '.join(tokens), 'expected_duplicate_of': None}
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Near-duplicate chunk detection (MinHash/LSH)')
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    filter_cmd = commands.add_parser('filter', help='Read chunks JSONL on stdin, write decisions JSONL to stdout')
+    filter_cmd.add_argument('--index', default='dedup_index.npz', help='Persistent index file (loaded and saved)')
+    filter_cmd.add_argument('--mode', choices=('skip', 'link'), default='skip',
+                            help='skip: drop duplicates and already indexed chunks; link: emit them with action '
+                                 '"link" (duplicate_of set) or "noop"')
+    filter_cmd.add_argument('--threshold', type=float, default=THRESHOLD)
+    filter_cmd.add_argument('--batch-size', type=int, default=BATCH_SIZE)
+    filter_cmd.add_argument('--embedding-dim', type=int, default=EMBEDDING_DIM)
+    filter_cmd.add_argument('--report', default=None)
+
+    remove_cmd = commands.add_parser('remove', help='Forget chunks of deleted or re-chunked documents')
+    remove_cmd.add_argument('ids', nargs='*', help='Chunk ids to remove')
+    remove_cmd.add_argument('--index', default='dedup_index.npz')
+    remove_cmd.add_argument('--prefix', action='append', default=[],
+                            help='Remove every chunk whose id starts with this (e.g. "<doc_id>:"); repeatable')
+
+    bench_cmd = commands.add_parser('bench', help='Measure per-chunk overhead and detection quality')
+    bench_cmd.add_argument('--chunks', type=int, default=100_000)
+    bench_cmd.add_argument('--duplicate-rate', type=float, default=0.2)
+    bench_cmd.add_argument('--batch-size', type=int, default=BATCH_SIZE)
+    bench_cmd.add_argument('--report', default=None)
+
+    args = parser.parse_args()
+
+    if args.command == 'filter':
+        try:
+            index = LSHIndex.load(args.index)
+            index.threshold = args.threshold
+        except FileNotFoundError:
+            index = LSHIndex(threshold=args.threshold)
+        dedup = Deduplicator(index, embedding_dim=args.embedding_dim)
+        for batch in _read_batches(sys.stdin, args.batch_size):
+            for chunk in dedup.process(batch):
+                if chunk['already_indexed']:
+                    chunk['action'] = 'noop'
+                else:
+                    chunk['action'] = 'embed' if chunk['duplicate_of'] is None else args.mode
+                if chunk['action'] == 'embed' or args.mode == 'link':
+                    sys.stdout.write(json.dumps(chunk, ensure_ascii=False) + '\n')
+        # Duplicates of chunks whose text changed, unless they came through again in this run
+        _write_resend(label for label in index.orphaned if label not in index)
+        index.save(args.index)
+        report = dedup.report()
+
+    elif args.command == 'remove':
+        try:
+            index = LSHIndex.load(args.index)
+        except FileNotFoundError:
+            print(f"⚠️ No index at {args.index}, nothing to remove", file=sys.stderr)
+            return
+        labels = list(args.ids)
+        for prefix in args.prefix:
+            labels += index.labels_with_prefix(prefix)
+        removed = sum(label in index for label in set(labels))
+        orphaned = index.remove(labels)
+        _write_resend(orphaned)
+        index.save(args.index)
+        print(f"🗑️ Removed {removed} chunks from {args.index}; {len(orphaned)} duplicates to send again",
+              file=sys.stderr)
+        return
+
+    else:
+        dedup = Deduplicator()
+        expected = found = false_positives = 0
+        stream = synthetic_chunks(args.chunks, args.duplicate_rate)
+        start = time.perf_counter()
+        for batch in _read_batches((json.dumps(c) + '\n' for c in stream), args.batch_size):
+            for chunk in dedup.process(batch):
+                if chunk['expected_duplicate_of']:
+                    expected += 1
+                    found += chunk['duplicate_of'] is not None
+                elif chunk['duplicate_of'] is not None:
+                    false_positives += 1
+            if dedup.chunks % (args.batch_size * 100) == 0:
+                print(f"  {dedup.chunks:>10,} chunks  {dedup.report()['overhead_us_per_chunk']} us/chunk",
+                      file=sys.stderr)
+        report = dedup.report()
+        report['wall_seconds'] = round(time.perf_counter() - start, 2)
+        report['recall'] = round(found / expected, 4) if expected else None
+        report['false_positives'] = false_positives
+
+    print(json.dumps(report, indent=2), file=sys.stderr)
+    if args.report:
+        with open(args.report, 'w') as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
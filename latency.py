@@ -0,0 +1,100 @@
+"""
+Latency recording, percentile summaries and baseline comparison for VexaAI
+"""
+
+import json
+import math
+import os
+from datetime import datetime
+
+
+def percentile(samples, pct: float) -> float:
+    """Return the pct-th percentile (0-100) of samples using linear interpolation"""
+    if not samples:
+        return 0.0
+    ordered = sorted(samples)
+    if len(ordered) == 1:
+        return float(ordered[0])
+    rank = (len(ordered) - 1) * pct / 100.0
+    low = math.floor(rank)
+    high = math.ceil(rank)
+    if low == high:
+        return float(ordered[low])
+    return ordered[low] + (ordered[high] - ordered[low]) * (rank - low)
+
+
+def summarize(samples) -> dict:
+    """Summarize a list of latencies (milliseconds)"""
+    if not samples:
+        return {'count': 0, 'mean_ms': 0.0, 'p50_ms': 0.0, 'p95_ms': 0.0, 'p99_ms': 0.0, 'max_ms': 0.0}
+    return {
+        'count': len(samples),
+        'mean_ms': round(sum(samples) / len(samples), 3),
+        'p50_ms': round(percentile(samples, 50), 3),
+        'p95_ms': round(percentile(samples, 95), 3),
+        'p99_ms': round(percentile(samples, 99), 3),
+        'max_ms': round(max(samples), 3),
+    }
+
+
+class LatencyRecorder:
+    """Collect latency samples (milliseconds) keyed by name"""
+
+    def __init__(self):
+        self.samples = {}
+
+    def record(self, name: str, latency_ms: float):
+        self.samples.setdefault(name, []).append(latency_ms)
+
+    def summary(self) -> dict:
+        return {name: summarize(values) for name, values in sorted(self.samples.items())}
+
+
+def load_baseline_report(path: str) -> dict:
+    """Load a stored baseline report (latency and metadata), or an empty dict if none exists"""
+    if not path or not os.path.exists(path):
+        return {}
+    with open(path) as f:
+        return json.load(f)
+
+
+def load_baseline(path: str) -> dict:
+    """Load the per-check latencies of a stored baseline, or an empty dict if none exists"""
+    return load_baseline_report(path).get('latency', {})
+
+
+def compare_to_baseline(summary: dict, baseline: dict, threshold: float, slack_ms: float = 0.0):
+    """
+    Compare p95 latencies against a baseline.
+
+    A check regresses when its p95 exceeds the baseline p95 by more than
+    `threshold` (a fraction, e.g. 0.2 = 20%) and by more than `slack_ms`.
+    Returns a list of regression dicts.
+    """
+    regressions = []
+    for name, current in summary.items():
+        previous = baseline.get(name)
+        if not previous or not current['count']:
+            continue
+        allowed = previous['p95_ms'] * (1 + threshold)
+        if current['p95_ms'] > allowed and current['p95_ms'] - previous['p95_ms'] > slack_ms:
+            regressions.append({
+                'name': name,
+                'baseline_p95_ms': previous['p95_ms'],
+                'current_p95_ms': current['p95_ms'],
+                'change_pct': round((current['p95_ms'] / previous['p95_ms'] - 1) * 100, 1) if previous['p95_ms'] else None,
+            })
+    return regressions
+
+
+def write_report(path: str, summary: dict, regressions=None, metadata=None):
+    """Write a machine-readable latency report"""
+    report = {
+        'generated_at': datetime.now().isoformat(),
+        'metadata': metadata or {},
+        'latency': summary,
+        'regressions': regressions or [],
+    }
+    with open(path, 'w') as f:
+        json.dump(report, f, indent=2)
+    return report
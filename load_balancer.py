@@ -0,0 +1,308 @@
+"""
+Latency-aware load balancing across several n8n webhook endpoints
+
+Endpoints are chosen by peak-EWMA latency weighted by outstanding
+requests, or by least outstanding requests. Optionally a request is
+hedged: if the first attempt has not answered by the current p95, a copy
+goes to another endpoint. The losing attempt is cancelled if it is still
+queued, or its socket is shut down if it is in flight.
+
+Aborting the connection does not stop an n8n execution that has already
+started, so both copies may run the agent. Hedged payloads carry a
+`request_id` that the flow must dedupe on before writing chat memory;
+keep hedging off for flows that do not.
+"""
+
+import math
+import os
+import socket
+import threading
+import time
+import uuid
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from latency import percentile
+
+PEAK_EWMA = 'peak_ewma'
+LEAST_OUTSTANDING = 'least_outstanding'
+
+
+class Endpoint:
+    """Health and latency statistics for one webhook URL"""
+
+    def __init__(self, url: str, decay: float = 10.0, failure_threshold: int = 3, cooldown: float = 15.0):
+        self.url = url
+        self.decay = decay
+        self.failure_threshold = failure_threshold
+        self.cooldown = cooldown
+
+        self.ewma = 0.0
+        self.outstanding = 0
+        self.requests = 0
+        self.errors = 0
+        self.cancelled = 0
+        self.hedges_won = 0
+        self.consecutive_failures = 0
+        self.last_failure = 0.0
+        self.latencies = deque(maxlen=200)
+        self._last_update = time.monotonic()
+        self._lock = threading.Lock()
+
+    @property
+    def healthy(self) -> bool:
+        if self.consecutive_failures < self.failure_threshold:
+            return True
+        # Let traffic back in after the cool-down so recovery is noticed
+        return time.monotonic() - self.last_failure > self.cooldown
+
+    def cost(self, strategy: str) -> float:
+        if strategy == LEAST_OUTSTANDING:
+            return self.outstanding
+        # Decay while idle so a once-slow endpoint is eventually retried
+        idle = time.monotonic() - self._last_update
+        return self.ewma * math.exp(-idle / self.decay) * (self.outstanding + 1)
+
+    def start(self):
+        with self._lock:
+            self.outstanding += 1
+            self.requests += 1
+
+    def finish(self, latency: float, ok: bool, cancelled: bool = False):
+        now = time.monotonic()
+        with self._lock:
+            self.outstanding -= 1
+            if cancelled:
+                self.cancelled += 1
+                return
+            if ok:
+                self.consecutive_failures = 0
+                self.latencies.append(latency)
+            else:
+                self.errors += 1
+                self.consecutive_failures += 1
+                self.last_failure = now
+            # Peak EWMA: jump up to slow samples immediately, decay down slowly
+            if latency > self.ewma:
+                self.ewma = latency
+            else:
+                weight = math.exp(-(now - self._last_update) / self.decay)
+                self.ewma = self.ewma * weight + latency * (1 - weight)
+            self._last_update = now
+
+    def snapshot(self) -> dict:
+        return {
+            'url': self.url,
+            'healthy': self.healthy,
+            'ewma_ms': round(self.ewma * 1000, 1),
+            'p95_ms': round(percentile(list(self.latencies), 95) * 1000, 1) if self.latencies else None,
+            'outstanding': self.outstanding,
+            'requests': self.requests,
+            'errors': self.errors,
+            'cancelled': self.cancelled,
+            'hedges_won': self.hedges_won,
+        }
+
+
+class _AbortableAdapter(HTTPAdapter):
+    """HTTPAdapter that keeps its sockets so an in-flight request can be aborted"""
+
+    def __init__(self):
+        self.sockets = []
+        self.aborted = False
+        self._lock = threading.Lock()
+        super().__init__(max_retries=0)
+
+    def init_poolmanager(self, *args, **kwargs):
+        super().init_poolmanager(*args, **kwargs)
+        adapter = self
+        pool_classes = {}
+        for scheme, pool_cls in self.poolmanager.pool_classes_by_scheme.items():
+            class RecordingConnection(pool_cls.ConnectionCls):
+                def connect(self):
+                    super().connect()
+                    adapter._opened(self.sock)
+
+            pool_classes[scheme] = type(pool_cls.__name__, (pool_cls,), {'ConnectionCls': RecordingConnection})
+        self.poolmanager.pool_classes_by_scheme = pool_classes
+
+    def _opened(self, sock):
+        with self._lock:
+            self.sockets.append(sock)
+            aborted = self.aborted
+        if aborted:
+            _shutdown(sock)
+
+    def abort(self):
+        """Shut down every socket, failing a blocked read or write in the worker thread"""
+        with self._lock:
+            self.aborted = True
+            sockets = list(self.sockets)
+        for sock in sockets:
+            _shutdown(sock)
+
+
+def _shutdown(sock):
+    try:
+        sock.shutdown(socket.SHUT_RDWR)
+    except OSError:
+        pass
+
+
+class _Attempt:
+    def __init__(self, endpoint: Endpoint, hedge: bool = False):
+        self.endpoint = endpoint
+        self.hedge = hedge
+        self.adapter = _AbortableAdapter()
+        self.session = requests.Session()
+        self.session.mount('http://', self.adapter)
+        self.session.mount('https://', self.adapter)
+        self.cancelled = False
+        self.future = None
+
+    def cancel(self):
+        """Drop the attempt if still queued, otherwise abort its connection"""
+        self.cancelled = True
+        if self.future is not None and self.future.cancel():
+            return
+        self.adapter.abort()
+
+
+class LoadBalancer:
+    """Route webhook calls across endpoints, with optional hedged requests"""
+
+    def __init__(self, urls, strategy: str = PEAK_EWMA, hedge: bool = False,
+                 hedge_min_samples: int = 20, max_workers: int = 32):
+        if not urls:
+            raise ValueError("At least one webhook URL is required")
+        self.endpoints = [Endpoint(url) for url in urls]
+        self.strategy = strategy
+        self.hedge = hedge and len(self.endpoints) > 1
+        self.hedge_min_samples = hedge_min_samples
+        self.hedged = 0
+        self._recent = deque(maxlen=500)
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='webhook')
+
+    def pick(self, exclude=()) -> Endpoint:
+        candidates = [e for e in self.endpoints if e not in exclude]
+        if not candidates:
+            return None
+        healthy = [e for e in candidates if e.healthy] or candidates
+        return min(healthy, key=lambda e: (e.cost(self.strategy), e.outstanding))
+
+    def hedge_delay(self):
+        """Current p95 across endpoints, or None until enough samples exist"""
+        if not self.hedge or len(self._recent) < self.hedge_min_samples:
+            return None
+        return percentile(list(self._recent), 95)
+
+    def _call(self, attempt: _Attempt, payload: dict, timeout: float):
+        endpoint = attempt.endpoint
+        endpoint.start()
+        start = time.perf_counter()
+        ok = False
+        try:
+            response = attempt.session.post(endpoint.url, json=payload,
+                                            headers={"Content-Type": "application/json"}, timeout=timeout)
+            ok = response.status_code < 500
+            return response
+        finally:
+            latency = time.perf_counter() - start
+            endpoint.finish(latency, ok, cancelled=attempt.cancelled)
+            if ok and not attempt.cancelled:
+                self._recent.append(latency)
+            attempt.session.close()
+
+    def _submit(self, endpoint: Endpoint, payload: dict, timeout: float, hedge: bool = False) -> _Attempt:
+        attempt = _Attempt(endpoint, hedge)
+        attempt.future = self._executor.submit(self._call, attempt, payload, timeout)
+        return attempt
+
+    def post(self, payload: dict, timeout: float = 30) -> requests.Response:
+        """
+        Send payload to the best endpoint and return the first usable response.
+
+        Raises the last error (or requests.Timeout) if no attempt succeeds
+        within `timeout` seconds.
+        """
+        if self.hedge:
+            # Lets the backend recognise a hedged duplicate of the same request
+            payload = dict(payload, request_id=payload.get('request_id') or str(uuid.uuid4()))
+
+        deadline = time.monotonic() + timeout
+        primary = self._submit(self.pick(), payload, timeout)
+        attempts = {primary.future: primary}
+        hedge_delay = self.hedge_delay()
+        hedged = False
+        last_error = None
+        last_response = None
+
+        try:
+            while attempts:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                wait_for = min(hedge_delay, remaining) if hedge_delay is not None and not hedged else remaining
+                done, _ = wait(list(attempts), timeout=wait_for, return_when=FIRST_COMPLETED)
+
+                for future in done:
+                    attempt = attempts.pop(future)
+                    try:
+                        response = future.result()
+                    except Exception as e:
+                        last_error = e
+                        continue
+                    if response.status_code < 500:
+                        if attempt.hedge:
+                            attempt.endpoint.hedges_won += 1
+                        return response
+                    last_response = response
+
+                # Hedge when the first attempt is slower than p95, or fail over
+                # straight away when it has already failed. A wait that only
+                # ended at the deadline (or before p95 is known) is no reason to hedge.
+                slow = not done and hedge_delay is not None and time.monotonic() < deadline
+                if self.hedge and not hedged and (slow or not attempts):
+                    second = self.pick(exclude={a.endpoint for a in attempts.values()} | {primary.endpoint})
+                    if second:
+                        hedged = True
+                        self.hedged += 1
+                        remaining = max(0.1, deadline - time.monotonic())
+                        attempt = self._submit(second, payload, remaining, hedge=True)
+                        attempts[attempt.future] = attempt
+        finally:
+            for attempt in attempts.values():
+                attempt.cancel()
+
+        if last_response is not None:
+            return last_response
+        raise last_error or requests.exceptions.Timeout(f"No webhook endpoint answered within {timeout}s")
+
+    def snapshot(self) -> dict:
+        return {
+            'strategy': self.strategy,
+            'hedging': self.hedge,
+            'hedge_delay_ms': round(self.hedge_delay() * 1000, 1) if self.hedge_delay() is not None else None,
+            'hedged': self.hedged,
+            'endpoints': [e.snapshot() for e in self.endpoints],
+        }
+
+
+def parse_webhook_urls(value: str):
+    """Split a comma or whitespace separated list of webhook URLs"""
+    return [url for url in (value or '').replace(',', ' ').split() if url]
+
+
+def create_load_balancer(urls=None) -> LoadBalancer:
+    """Build a LoadBalancer from N8N_WEBHOOK_URL(S) and WEBHOOK_* environment variables"""
+    if urls is None:
+        urls = parse_webhook_urls(os.getenv('N8N_WEBHOOK_URLS') or os.getenv('N8N_WEBHOOK_URL'))
+    return LoadBalancer(
+        urls,
+        strategy=os.getenv('WEBHOOK_BALANCER', PEAK_EWMA),
+        hedge=os.getenv('WEBHOOK_HEDGE', 'false').lower() in ('1', 'true', 'yes'),
+        hedge_min_samples=int(os.getenv('WEBHOOK_HEDGE_MIN_SAMPLES', 20)),
+    )
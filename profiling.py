@@ -0,0 +1,174 @@
+"""
+Per-rerun profiling for the Streamlit app
+
+Every rerun is split into named sections (auth, sidebar, history render,
+network wait, ...) with cheap perf_counter timers. Selected reruns are
+additionally profiled, controlled by environment variables:
+
+    PROFILE_MODE=off|sample|full   sample: stack sampler, full: cProfile
+    PROFILE_RATE=0.05              fraction of reruns to profile
+    PROFILE_INTERVAL=0.005         seconds between stack samples
+    PROFILE_DIR=profiles           where profiles are written
+
+Sampled reruns are written as collapsed stacks (<rerun>.folded), which
+flamegraph.pl, speedscope and inferno read directly. Full reruns are
+written as cProfile stats (<rerun>.prof) for snakeviz or flameprof. Section
+timings of every profiled rerun are appended to reruns.jsonl.
+
+Only one full profile runs per process at a time: from Python 3.12
+cProfile uses process-wide sys.monitoring, so a second profiler cannot be
+enabled and would also record the other sessions' threads. A rerun
+selected while another is being profiled gets timers only.
+"""
+
+import cProfile
+import json
+import os
+import random
+import sys
+import threading
+import time
+import weakref
+from collections import Counter
+from contextlib import contextmanager
+from datetime import datetime
+
+OFF = 'off'
+SAMPLE = 'sample'
+FULL = 'full'
+
+_full_profile_lock = threading.Lock()
+
+
+def _start_full_profile():
+    """A running cProfile.Profile, or None if another full profile is active"""
+    if not _full_profile_lock.acquire(blocking=False):
+        return None
+    try:
+        profiler = cProfile.Profile()
+        profiler.enable()
+    except ValueError:
+        # Another profiling tool (debugger, coverage, ...) owns sys.monitoring
+        _full_profile_lock.release()
+        return None
+    return profiler
+
+
+def _stop_full_profile(profiler):
+    profiler.disable()
+    _full_profile_lock.release()
+
+
+class StackSampler:
+    """Sample one thread's stack at a fixed interval into collapsed-stack counts"""
+
+    def __init__(self, thread_id: int, interval: float = 0.005):
+        self.thread_id = thread_id
+        self.interval = interval
+        self.stacks = Counter()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            if frame is None:
+                continue
+            names = []
+            while frame is not None:
+                code = frame.f_code
+                names.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})")
+                frame = frame.f_back
+            self.stacks[';'.join(reversed(names))] += 1
+
+    def folded(self) -> str:
+        return ''.join(f"{stack} {count}\n" for stack, count in self.stacks.most_common())
+
+
+class RerunProfile:
+    """Section timings for one rerun, plus an optional sampler or cProfile"""
+
+    def __init__(self, mode: str = OFF, directory: str = 'profiles', interval: float = 0.005):
+        self.mode = mode
+        self.directory = directory
+        self.sections = {}
+        self.started = time.perf_counter()
+        self.total = None
+        self._sampler = None
+        self._profiler = None
+        self._stop_profiler = None
+
+        if mode == SAMPLE:
+            self._sampler = StackSampler(threading.get_ident(), interval)
+            self._sampler.start()
+        elif mode == FULL:
+            self._profiler = _start_full_profile()
+            if self._profiler is None:
+                self.mode = OFF
+            else:
+                # Also stops the profiler if the rerun is abandoned without finish()
+                self._stop_profiler = weakref.finalize(self, _stop_full_profile, self._profiler)
+
+    @property
+    def profiled(self) -> bool:
+        return self.mode != OFF
+
+    @contextmanager
+    def section(self, name: str):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.sections[name] = self.sections.get(name, 0.0) + time.perf_counter() - start
+
+    def breakdown(self) -> dict:
+        """Section timings in milliseconds, with unaccounted time as 'other'"""
+        total = self.total if self.total is not None else time.perf_counter() - self.started
+        result = {name: round(seconds * 1000, 2) for name, seconds in self.sections.items()}
+        result['other'] = round(max(0.0, total - sum(self.sections.values())) * 1000, 2)
+        result['total'] = round(total * 1000, 2)
+        return result
+
+    def finish(self):
+        """Stop profiling and write this rerun's files; returns the breakdown"""
+        if self.total is not None:
+            return self.breakdown()
+        self.total = time.perf_counter() - self.started
+        if self._stop_profiler:
+            self._stop_profiler()
+        if self._sampler:
+            self._sampler.stop()
+        breakdown = self.breakdown()
+        if self.profiled:
+            self._write(breakdown)
+        return breakdown
+
+    def _write(self, breakdown: dict):
+        os.makedirs(self.directory, exist_ok=True)
+        name = datetime.now().strftime('%Y%m%d-%H%M%S-%f')
+        if self._sampler:
+            with open(os.path.join(self.directory, f"{name}.folded"), 'w') as f:
+                f.write(self._sampler.folded())
+        if self._profiler:
+            self._profiler.dump_stats(os.path.join(self.directory, f"{name}.prof"))
+        with open(os.path.join(self.directory, 'reruns.jsonl'), 'a') as f:
+            f.write(json.dumps({'rerun': name, 'mode': self.mode, 'pid': os.getpid(), 'ms': breakdown}) + '\n')
+
+
+def start_rerun() -> RerunProfile:
+    """Start timing a rerun, profiling it if PROFILE_MODE and PROFILE_RATE select it"""
+    mode = os.getenv('PROFILE_MODE', OFF).lower()
+    if mode not in (SAMPLE, FULL) or random.random() >= float(os.getenv('PROFILE_RATE', 0.05)):
+        mode = OFF
+    return RerunProfile(
+        mode,
+        directory=os.getenv('PROFILE_DIR', 'profiles'),
+        interval=float(os.getenv('PROFILE_INTERVAL', 0.005)),
+    )
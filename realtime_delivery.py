@@ -0,0 +1,224 @@
+"""
+Push-based answer delivery via Supabase Realtime
+
+In this mode the webhook acknowledges a message straight away with a
+job id, and the assistant's reply arrives later as an INSERT on
+chat_messages. Each replica keeps one Realtime subscription for the
+whole table and routes events into a mailbox by session_id and job id,
+so waiting sessions hold neither an HTTP connection nor a script thread.
+The flow must copy the job id into the row (`metadata.job_id`).
+
+REALTIME_URL=local:// swaps Supabase for an in-process LocalChangeFeed
+that emits the same change payloads; REALTIME_URL=stub://host:port
+follows the feed of a stub_webhook.py started with --realtime.
+"""
+
+import asyncio
+import json
+import threading
+import time
+from datetime import datetime, timezone
+
+TABLE = 'chat_messages'
+
+
+def record_role(record: dict):
+    return record.get('role') or (record.get('metadata') or {}).get('role')
+
+
+def record_content(record: dict):
+    return record.get('content') or record.get('message')
+
+
+def record_job_id(record: dict):
+    return record.get('job_id') or (record.get('metadata') or {}).get('job_id')
+
+
+def change_payload(record: dict, table: str = TABLE, event: str = 'INSERT') -> dict:
+    """Build a postgres_changes payload shaped like the ones Realtime delivers"""
+    return {
+        'data': {
+            'schema': 'public',
+            'table': table,
+            'commit_timestamp': datetime.now(timezone.utc).isoformat(),
+            'type': event,
+            'errors': None,
+            'columns': [{'name': name, 'type': 'text'} for name in record],
+            'record': record,
+        },
+        'ids': [],
+    }
+
+
+class AnswerMailbox:
+    """
+    Assistant replies held per session until the owning script picks them
+    up. A session may receive late replies to earlier jobs (e.g. one that
+    timed out), so replies are kept by job id and taken by job id.
+    """
+
+    def __init__(self, ttl: float = 300):
+        self.ttl = ttl
+        self.delivered = 0
+        self.dropped = 0
+        self._expected = {}  # session_id -> expiry
+        self._answers = {}   # session_id -> {job_id: record}
+        self._lock = threading.Lock()
+
+    def expect(self, session_id: str):
+        """Start keeping replies for session_id; call before sending, as the job id is not known yet"""
+        with self._lock:
+            self._expected[session_id] = time.time() + self.ttl
+
+    def forget(self, session_id: str):
+        with self._lock:
+            self._expected.pop(session_id, None)
+            self._answers.pop(session_id, None)
+
+    def deliver(self, payload: dict):
+        """postgres_changes callback: keep assistant inserts for sessions waiting on this replica"""
+        record = (payload.get('data') or {}).get('record') or {}
+        session_id = record.get('session_id')
+        job_id = record_job_id(record)
+        with self._lock:
+            self._purge_expired()
+            if session_id not in self._expected or record_role(record) != 'assistant' or not job_id:
+                self.dropped += 1
+                return
+            self._answers.setdefault(session_id, {})[job_id] = record
+            self.delivered += 1
+
+    def take(self, session_id: str, job_id: str):
+        """Pop the reply to job_id, or None; replies to other jobs of the session are discarded"""
+        with self._lock:
+            answers = self._answers.get(session_id)
+            if not answers or job_id not in answers:
+                return None
+            record = answers.pop(job_id)
+            self.dropped += len(answers)
+            del self._answers[session_id]
+            self._expected.pop(session_id, None)
+            return record
+
+    def _purge_expired(self):
+        now = time.time()
+        for session_id in [s for s, expires in self._expected.items() if expires < now]:
+            del self._expected[session_id]
+            self._answers.pop(session_id, None)
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            return {
+                'waiting_sessions': len(self._expected),
+                'queued_answers': sum(len(a) for a in self._answers.values()),
+                'delivered': self.delivered,
+                'dropped': self.dropped,
+            }
+
+
+class LocalChangeFeed:
+    """In-process stand-in for a Realtime postgres_changes subscription"""
+
+    def __init__(self):
+        self._callbacks = []
+
+    def subscribe(self, callback):
+        self._callbacks.append(callback)
+
+    def unsubscribe(self, callback):
+        if callback in self._callbacks:
+            self._callbacks.remove(callback)
+
+    def insert(self, record: dict, table: str = TABLE):
+        payload = change_payload(record, table)
+        for callback in list(self._callbacks):
+            callback(payload)
+
+
+# Shared by the app and the stub webhook when they run in one process
+local_feed = LocalChangeFeed()
+
+
+class RealtimeListener:
+    """One background Realtime subscription per replica, feeding a mailbox"""
+
+    def __init__(self, url: str, key: str, mailbox: AnswerMailbox, table: str = TABLE):
+        self.url = url
+        self.key = key
+        self.mailbox = mailbox
+        self.table = table
+        self.status = 'starting'
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name='realtime-listener', daemon=True)
+
+    def start(self):
+        if self.url.startswith('local://'):
+            local_feed.subscribe(self.mailbox.deliver)
+            self.status = 'local'
+        else:
+            self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+
+    def _run(self):
+        backoff = 1
+        while not self._stop.is_set():
+            try:
+                if self.url.startswith('stub://'):
+                    self._follow_stub()
+                else:
+                    asyncio.run(self._listen())
+                backoff = 1
+            except Exception as e:
+                self.status = f"error: {e}"
+                self._stop.wait(backoff)
+                backoff = min(backoff * 2, 60)
+
+    def _follow_stub(self):
+        """Read the newline-delimited change payloads a stub_webhook.py --realtime streams"""
+        import requests
+
+        url = 'http://' + self.url[len('stub://'):].rstrip('/') + '/realtime'
+        with requests.get(url, stream=True, timeout=(5, 60)) as response:
+            response.raise_for_status()
+            self.status = 'stub'
+            # readline rather than iter_lines, which waits for a full chunk
+            for line in iter(response.raw.readline, b''):
+                if self._stop.is_set():
+                    return
+                if line.strip():
+                    self.mailbox.deliver(json.loads(line))
+
+    async def _listen(self):
+        from supabase import acreate_client
+
+        client = await acreate_client(self.url, self.key)
+        channel = client.channel(f"{self.table}-inserts")
+        channel.on_postgres_changes('INSERT', self.mailbox.deliver, table=self.table, schema='public')
+
+        def on_status(state, error=None):
+            self.status = f"{state}: {error}" if error else str(state)
+
+        await channel.subscribe(on_status)
+        try:
+            while not self._stop.is_set():
+                await asyncio.sleep(1)
+        finally:
+            await client.remove_all_channels()
+
+
+def fetch_answer(supabase, session_id: str, job_id: str, since: str):
+    """Catch-up query for the reply to job_id whose change event this replica missed"""
+    result = supabase.table(TABLE)\
+        .select('*')\
+        .eq('session_id', session_id)\
+        .gte('created_at', since)\
+        .order('created_at', desc=True)\
+        .limit(20)\
+        .execute()
+    for record in result.data or []:
+        if record_role(record) == 'assistant' and record_job_id(record) == job_id:
+            return record
+    return None
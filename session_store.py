@@ -0,0 +1,265 @@
+"""
+Shared session store for VexaAI
+
+Keeps chat state outside the Streamlit process so any replica can pick
+up a browser session after a restart, drain or reconnect. State is
+serialized to compact zlib-compressed JSON, expires after a TTL and is
+written behind in batches by a background thread.
+
+Entries are keyed by a hash of an HttpOnly cookie (SESSION_COOKIE,
+default vexaai_sid) that the reverse proxy issues, so the key never
+appears in a URL, log line or Referer header. Without that cookie the
+app keeps state in the Streamlit session only.
+
+Backends are selected with SESSION_STORE_URL:
+    memory://                 per-process (single replica / development)
+    file:///data/sessions     local or shared on-disk directory
+    redis://redis:6379/0      Redis (recommended for multiple replicas)
+"""
+
+import atexit
+import hashlib
+import json
+import os
+import threading
+import time
+import zlib
+from urllib.parse import urlparse
+
+DEFAULT_TTL = 24 * 3600
+DEFAULT_COOKIE = 'vexaai_sid'
+MIN_TOKEN_LENGTH = 32
+PERSISTED_KEYS = ('session_id', 'messages', 'authenticated', 'user_id', 'username', 'email', 'pending_answer')
+
+
+def encode_state(state: dict) -> bytes:
+    """Serialize session state to compact, compressed JSON"""
+    data = {key: state[key] for key in PERSISTED_KEYS if key in state}
+    return zlib.compress(json.dumps(data, separators=(',', ':'), default=str).encode(), 6)
+
+
+def decode_state(blob: bytes) -> dict:
+    return json.loads(zlib.decompress(blob))
+
+
+def store_key(cookies, name: str = None):
+    """
+    Store key for a browser from its session cookie, or None when the
+    cookie is missing or too short to be a proxy-issued random token
+    """
+    token = cookies.get(name or os.getenv('SESSION_COOKIE', DEFAULT_COOKIE))
+    if not token or len(token) < MIN_TOKEN_LENGTH:
+        return None
+    return hashlib.sha256(token.encode()).hexdigest()
+
+
+class MemoryBackend:
+    """In-process dict with lazy TTL expiry"""
+
+    def __init__(self):
+        self._data = {}
+        self._lock = threading.Lock()
+
+    def get(self, key: str):
+        with self._lock:
+            entry = self._data.get(key)
+            if not entry:
+                return None
+            blob, expires = entry
+            if expires < time.time():
+                del self._data[key]
+                return None
+            return blob
+
+    def set_many(self, items: dict, ttl: int):
+        expires = time.time() + ttl
+        with self._lock:
+            for key, blob in items.items():
+                self._data[key] = (blob, expires)
+            self._purge_expired()
+
+    def delete(self, key: str):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def _purge_expired(self):
+        now = time.time()
+        for key in [k for k, (_, expires) in self._data.items() if expires < now]:
+            del self._data[key]
+
+
+class DiskBackend:
+    """One file per session in a directory; file mtime drives TTL expiry"""
+
+    purge_interval = 600
+
+    def __init__(self, directory: str, ttl: int = DEFAULT_TTL):
+        self.directory = directory
+        self.ttl = ttl
+        self._last_purge = time.time()
+        os.makedirs(directory, exist_ok=True)
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.directory, hashlib.sha256(key.encode()).hexdigest() + '.session')
+
+    def get(self, key: str):
+        path = self._path(key)
+        try:
+            if os.path.getmtime(path) + self.ttl < time.time():
+                os.remove(path)
+                return None
+            with open(path, 'rb') as f:
+                return f.read()
+        except OSError:
+            return None
+
+    def set_many(self, items: dict, ttl: int):
+        for key, blob in items.items():
+            path = self._path(key)
+            tmp = f"{path}.{os.getpid()}.tmp"
+            with open(tmp, 'wb') as f:
+                f.write(blob)
+            os.replace(tmp, path)
+        if time.time() - self._last_purge > self.purge_interval:
+            self._last_purge = time.time()
+            self.purge_expired()
+
+    def delete(self, key: str):
+        try:
+            os.remove(self._path(key))
+        except OSError:
+            pass
+
+    def purge_expired(self):
+        cutoff = time.time() - self.ttl
+        for name in os.listdir(self.directory):
+            path = os.path.join(self.directory, name)
+            try:
+                if name.endswith('.session') and os.path.getmtime(path) < cutoff:
+                    os.remove(path)
+            except OSError:
+                pass
+
+
+class RedisBackend:
+    """Redis with SETEX expiry; batches are sent as one pipeline"""
+
+    def __init__(self, url: str, prefix: str = 'vexaai:session:'):
+        try:
+            import redis
+        except ImportError:
+            raise RuntimeError("Redis session store requires the redis package: pip install redis")
+        self.client = redis.Redis.from_url(url)
+        self.prefix = prefix
+
+    def get(self, key: str):
+        return self.client.get(self.prefix + key)
+
+    def set_many(self, items: dict, ttl: int):
+        pipe = self.client.pipeline(transaction=False)
+        for key, blob in items.items():
+            pipe.setex(self.prefix + key, ttl, blob)
+        pipe.execute()
+
+    def delete(self, key: str):
+        self.client.delete(self.prefix + key)
+
+
+class SessionStore:
+    """
+    Write-behind session store.
+
+    save() only records the latest blob per key; a background thread
+    flushes pending writes to the backend every `flush_interval` seconds
+    or as soon as `batch_size` keys are pending.
+    """
+
+    def __init__(self, backend, ttl: int = DEFAULT_TTL, flush_interval: float = 1.0, batch_size: int = 100):
+        self.backend = backend
+        self.ttl = ttl
+        self.flush_interval = flush_interval
+        self.batch_size = batch_size
+        self._pending = {}
+        self._lock = threading.Lock()
+        # Held while a batch is being written so delete() cannot be overtaken by it
+        self._flush_lock = threading.Lock()
+        self._wake = threading.Event()
+        self._closed = False
+        self._thread = threading.Thread(target=self._flush_loop, daemon=True)
+        self._thread.start()
+        atexit.register(self.close)
+
+    def load(self, key: str):
+        """Return the stored state dict for key, or None"""
+        with self._lock:
+            blob = self._pending.get(key)
+        if blob is None:
+            try:
+                blob = self.backend.get(key)
+            except Exception:
+                return None
+        return decode_state(blob) if blob else None
+
+    def save(self, key: str, state: dict):
+        """Queue state for writing"""
+        self.put(key, encode_state(state))
+
+    def put(self, key: str, blob: bytes):
+        """Queue an already encoded blob for writing"""
+        with self._lock:
+            self._pending[key] = blob
+            if len(self._pending) >= self.batch_size:
+                self._wake.set()
+
+    def delete(self, key: str):
+        with self._flush_lock:
+            with self._lock:
+                self._pending.pop(key, None)
+            self.backend.delete(key)
+
+    def flush(self):
+        with self._flush_lock:
+            with self._lock:
+                items, self._pending = self._pending, {}
+            if not items:
+                return
+            try:
+                self.backend.set_many(items, self.ttl)
+            except Exception:
+                # Keep the writes for the next attempt unless newer ones replaced them
+                with self._lock:
+                    for key, blob in items.items():
+                        self._pending.setdefault(key, blob)
+
+    def _flush_loop(self):
+        while not self._closed:
+            self._wake.wait(self.flush_interval)
+            self._wake.clear()
+            self.flush()
+
+    def close(self):
+        self._closed = True
+        self._wake.set()
+        self.flush()
+
+
+def create_session_store(url: str = None, ttl: int = None) -> SessionStore:
+    """Build a SessionStore from a SESSION_STORE_URL-style URL"""
+    url = url or os.getenv('SESSION_STORE_URL', 'memory://')
+    ttl = ttl or int(os.getenv('SESSION_TTL_SECONDS', DEFAULT_TTL))
+    parsed = urlparse(url)
+
+    if parsed.scheme == 'memory':
+        backend = MemoryBackend()
+    elif parsed.scheme == 'file':
+        backend = DiskBackend(parsed.netloc + parsed.path, ttl=ttl)
+    elif parsed.scheme in ('redis', 'rediss'):
+        backend = RedisBackend(url)
+    else:
+        raise ValueError(f"Unsupported SESSION_STORE_URL scheme: {parsed.scheme}")
+
+    return SessionStore(
+        backend,
+        ttl=ttl,
+        flush_interval=float(os.getenv('SESSION_FLUSH_INTERVAL', 1.0)),
+    )
@@ -0,0 +1,278 @@
+"""
+Long-session soak test for the chat webhook
+
+Drives many sessions through hundreds of turns each and reports how
+latency drifts as conversation history grows, so we can see where the
+agent needs history trimming.
+
+Usage:
+    python soak.py --sessions 20 --turns 300 --concurrency 10 --duration 3600
+    python soak.py --webhook-url "$N8N_WEBHOOK_URL" --report soak_report.json
+"""
+
+import argparse
+import json
+import os
+import queue
+import resource
+import socket
+import subprocess
+import sys
+import threading
+import time
+import uuid
+from datetime import datetime
+
+import requests
+
+from latency import summarize
+from webhook import PROMPTS, make_payload
+
+
+def rss_mb() -> float:
+    """Resident set size of this process in MB"""
+    try:
+        with open('/proc/self/status') as f:
+            for line in f:
+                if line.startswith('VmRSS:'):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    # Peak RSS; kilobytes on Linux, bytes on macOS
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / (1024 * 1024) if sys.platform == 'darwin' else peak / 1024
+
+
+def start_stub_process(history_latency: float = 0.0):
+    """
+    Run the local stand-in in its own process, so its chat memory does not
+    count towards the client memory measured here. Returns (process, url).
+    """
+    with socket.socket() as probe:
+        probe.bind(('127.0.0.1', 0))
+        port = probe.getsockname()[1]
+    script = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'stub_webhook.py')
+    process = subprocess.Popen(
+        [sys.executable, '-u', script, '--port', str(port), '--history-latency', str(history_latency)],
+        stdout=subprocess.PIPE, text=True,
+    )
+    # The stub prints its URL once it is listening
+    line = process.stdout.readline()
+    if 'listening' not in line:
+        process.kill()
+        raise RuntimeError(f"Stub webhook did not start: {line.strip() or 'no output'}")
+    return process, f"http://127.0.0.1:{port}/webhook/chat"
+
+
+class SoakRun:
+    """Run sessions concurrently, each turn sequential, recording latency per turn index"""
+
+    def __init__(self, url: str, sessions: int = 10, turns: int = 200, concurrency: int = 5,
+                 duration: float = None, think_time: float = 0.0, timeout: float = 30,
+                 turn_bucket: int = 10, interval: float = 60):
+        self.url = url
+        self.sessions = sessions
+        self.turns = turns
+        self.concurrency = concurrency
+        self.duration = duration
+        self.think_time = think_time
+        self.timeout = timeout
+        self.turn_bucket = turn_bucket
+        self.interval = interval
+
+        self.results = []  # (elapsed_s, turn_index, latency_ms, ok)
+        self.memory = []   # (elapsed_s, rss_mb)
+        self.sessions_started = 0
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._start = None
+
+    def _elapsed(self) -> float:
+        return time.monotonic() - self._start
+
+    def _expired(self) -> bool:
+        return self._stop.is_set() or (self.duration is not None and self._elapsed() >= self.duration)
+
+    def _run_session(self, http: requests.Session):
+        session_id = str(uuid.uuid4())
+        user_id = str(uuid.uuid4())
+        for turn in range(1, self.turns + 1):
+            if self._expired():
+                return
+            message = f"{PROMPTS[(turn - 1) % len(PROMPTS)]} (turn {turn})"
+            start = time.perf_counter()
+            try:
+                response = http.post(self.url, json=make_payload(message, session_id, user_id), timeout=self.timeout)
+                ok = response.status_code == 200
+            except requests.RequestException:
+                ok = False
+            latency_ms = (time.perf_counter() - start) * 1000
+            with self._lock:
+                self.results.append((self._elapsed(), turn, latency_ms, ok))
+            if self.think_time:
+                time.sleep(self.think_time)
+
+    def _worker(self, pending: queue.Queue):
+        with requests.Session() as http:
+            while not self._expired():
+                try:
+                    pending.get_nowait()
+                except queue.Empty:
+                    # With a duration, keep starting fresh sessions until the deadline
+                    if self.duration is None:
+                        return
+                with self._lock:
+                    self.sessions_started += 1
+                self._run_session(http)
+
+    def _sample_memory(self):
+        while not self._stop.is_set():
+            self.memory.append((round(self._elapsed(), 1), round(rss_mb(), 2)))
+            self._stop.wait(min(self.interval, 10))
+
+    def run(self) -> dict:
+        self._start = time.monotonic()
+        pending = queue.Queue()
+        for i in range(self.sessions):
+            pending.put(i)
+
+        sampler = threading.Thread(target=self._sample_memory, daemon=True)
+        sampler.start()
+        workers = [threading.Thread(target=self._worker, args=(pending,), daemon=True)
+                   for _ in range(self.concurrency)]
+        for worker in workers:
+            worker.start()
+        try:
+            for worker in workers:
+                worker.join()
+        except KeyboardInterrupt:
+            print("\n⏹️  Interrupted, writing partial report")
+            self._stop.set()
+        self._stop.set()
+        sampler.join()
+        self.memory.append((round(self._elapsed(), 1), round(rss_mb(), 2)))
+        return self.report()
+
+    def _grouped(self, key) -> dict:
+        groups = {}
+        for row in self.results:
+            groups.setdefault(key(row), []).append(row)
+        result = {}
+        for group, rows in sorted(groups.items()):
+            stats = summarize([r[2] for r in rows])
+            stats['error_rate'] = round(sum(1 for r in rows if not r[3]) / len(rows), 4)
+            result[group] = stats
+        return result
+
+    def report(self) -> dict:
+        by_turn = self._grouped(lambda r: (r[1] - 1) // self.turn_bucket * self.turn_bucket + 1)
+        by_hour = self._grouped(lambda r: int(r[0] // 3600))
+        by_interval = self._grouped(lambda r: int(r[0] // self.interval))
+
+        return {
+            'generated_at': datetime.now().isoformat(),
+            'config': {
+                'url': self.url,
+                'sessions': self.sessions,
+                'turns': self.turns,
+                'concurrency': self.concurrency,
+                'duration_s': self.duration,
+                'turn_bucket': self.turn_bucket,
+                'interval_s': self.interval,
+            },
+            'elapsed_s': round(self._elapsed(), 1),
+            'sessions_started': self.sessions_started,
+            'overall': summarize([r[2] for r in self.results]),
+            'error_rate': round(sum(1 for r in self.results if not r[3]) / len(self.results), 4) if self.results else 0.0,
+            'drift': drift(by_turn),
+            'latency_by_turn': {f"{start}-{start + self.turn_bucket - 1}": stats for start, stats in by_turn.items()},
+            'latency_by_hour': {f"hour {hour}": stats for hour, stats in by_hour.items()},
+            'error_rate_timeline': [
+                {'start_s': index * self.interval, 'requests': stats['count'], 'error_rate': stats['error_rate']}
+                for index, stats in by_interval.items()
+            ],
+            'memory': {
+                'start_mb': self.memory[0][1] if self.memory else None,
+                'end_mb': self.memory[-1][1] if self.memory else None,
+                'growth_mb': round(self.memory[-1][1] - self.memory[0][1], 2) if self.memory else None,
+                'samples': self.memory,
+            },
+        }
+
+
+def drift(by_turn: dict, threshold: float = 0.5) -> dict:
+    """
+    Fit p50 latency against turn number and find where p95 first exceeds
+    the first bucket's p95 by `threshold` (fraction) — a hint for where
+    history trimming should kick in.
+    """
+    points = [(start, stats['p50_ms']) for start, stats in by_turn.items()]
+    if len(points) < 2:
+        return {'ms_per_turn': 0.0, 'trim_history_after_turn': None}
+
+    n = len(points)
+    mean_x = sum(x for x, _ in points) / n
+    mean_y = sum(y for _, y in points) / n
+    var_x = sum((x - mean_x) ** 2 for x, _ in points)
+    slope = sum((x - mean_x) * (y - mean_y) for x, y in points) / var_x if var_x else 0.0
+
+    first_p95 = next(iter(by_turn.values()))['p95_ms']
+    trim_after = None
+    for start, stats in by_turn.items():
+        if first_p95 and stats['p95_ms'] > first_p95 * (1 + threshold):
+            trim_after = start
+            break
+
+    return {'ms_per_turn': round(slope, 4), 'trim_history_after_turn': trim_after}
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Long-session soak test for the chat webhook')
+    parser.add_argument('--webhook-url', default=os.getenv('WEBHOOK_TEST_URL'),
+                        help='Endpoint to soak (default: local stand-in)')
+    parser.add_argument('--sessions', type=int, default=10,
+                        help='Sessions to run (with --duration: initial sessions, replaced until the deadline)')
+    parser.add_argument('--turns', type=int, default=200, help='Turns per session')
+    parser.add_argument('--concurrency', type=int, default=5, help='Sessions driven in parallel')
+    parser.add_argument('--duration', type=float, default=None,
+                        help='Run for this many seconds, starting new sessions as others finish')
+    parser.add_argument('--think-time', type=float, default=0.0, help='Seconds between turns')
+    parser.add_argument('--timeout', type=float, default=30)
+    parser.add_argument('--turn-bucket', type=int, default=10, help='Group turn indexes into buckets of this size')
+    parser.add_argument('--interval', type=float, default=60, help='Seconds per error-rate timeline slot')
+    parser.add_argument('--stub-history-latency', type=float, default=0.0005,
+                        help='Local stand-in only: extra seconds per prior turn in the session')
+    parser.add_argument('--report', default='soak_report.json')
+    args = parser.parse_args()
+
+    stub = None
+    url = args.webhook_url
+    if not url:
+        stub, url = start_stub_process(args.stub_history_latency)
+
+    print(f"🚀 Soaking {url}: {args.sessions} sessions x {args.turns} turns, concurrency {args.concurrency}")
+    run = SoakRun(url, sessions=args.sessions, turns=args.turns, concurrency=args.concurrency,
+                  duration=args.duration, think_time=args.think_time, timeout=args.timeout,
+                  turn_bucket=args.turn_bucket, interval=args.interval)
+    try:
+        report = run.run()
+    finally:
+        if stub:
+            stub.terminate()
+            stub.wait()
+
+    with open(args.report, 'w') as f:
+        json.dump(report, f, indent=2)
+
+    print(f"\n📊 {report['overall']['count']} turns over {report['sessions_started']} sessions "
+          f"in {report['elapsed_s']}s, error rate {report['error_rate'] * 100:.2f}%")
+    print(f"📈 Drift: {report['drift']['ms_per_turn']} ms/turn, "
+          f"trim history after turn: {report['drift']['trim_history_after_turn']}")
+    print(f"💾 Client memory growth: {report['memory']['growth_mb']} MB")
+    for bucket, stats in report['latency_by_turn'].items():
+        print(f"   turns {bucket:>9}: p50 {stats['p50_ms']:8.1f} ms  p95 {stats['p95_ms']:8.1f} ms  errors {stats['error_rate'] * 100:.1f}%")
+    print(f"\n📝 Report written: {args.report}")
+
+
+if __name__ == "__main__":
+    main()
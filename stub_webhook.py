@@ -0,0 +1,237 @@
+"""
+Local stand-in for the n8n chat webhook
+
+Mimics the request validation and response shape of the production
+workflow so the webhook suite and load tools can run without n8n.
+With a change feed (--realtime on the command line) it acknowledges with
+a job id and streams the reply rows on GET /realtime, which the app
+follows with REALTIME_URL=stub://host:port.
+"""
+
+import json
+import queue
+import sys
+import threading
+import time
+import uuid
+from datetime import datetime, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+REQUIRED_FIELDS = ('message', 'session_id', 'user_id')
+
+
+class ChatMemory:
+    """
+    Per-session message history. Several stubs can share one instance,
+    like n8n workers sharing a chat memory database; a request_id seen
+    before (a hedged duplicate) is not recorded twice.
+    """
+
+    def __init__(self):
+        self.sessions = {}
+        self._turn_by_request = {}
+        self._lock = threading.Lock()
+
+    def record(self, session_id: str, message: str, request_id: str = None) -> int:
+        """Append message to the session and return its turn number"""
+        with self._lock:
+            if request_id and request_id in self._turn_by_request:
+                return self._turn_by_request[request_id]
+            turns = self.sessions.setdefault(session_id, [])
+            turns.append(message)
+            if request_id:
+                self._turn_by_request[request_id] = len(turns)
+            return len(turns)
+
+
+class _Server(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def handle_error(self, request, client_address):
+        # Clients that gave up before the reply (e.g. an aborted hedge) are expected
+        if isinstance(sys.exc_info()[1], (BrokenPipeError, ConnectionResetError)):
+            return
+        super().handle_error(request, client_address)
+
+
+class StubWebhookServer:
+    """Threaded HTTP server answering chat webhook requests"""
+
+    def __init__(self, host: str = '127.0.0.1', port: int = 0, latency: float = 0.0, error_rate: float = 0.0,
+                 history_latency: float = 0.0, change_feed=None, memory: ChatMemory = None):
+        self.latency = latency
+        self.history_latency = history_latency
+        # With a change feed, acknowledge at once and publish the reply as a chat_messages insert
+        self.change_feed = change_feed
+        self.error_rate = error_rate
+        self.requests = 0
+        self.memory = memory or ChatMemory()
+        self._lock = threading.Lock()
+        self._server = _Server((host, port), self._make_handler())
+        self._thread = None
+
+    @property
+    def history(self) -> dict:
+        return self.memory.sessions
+
+    @property
+    def url(self) -> str:
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}/webhook/chat"
+
+    @property
+    def realtime_url(self) -> str:
+        host, port = self._server.server_address[:2]
+        return f"stub://{host}:{port}"
+
+    def serve_forever(self):
+        self._server.serve_forever()
+
+    def start(self):
+        self._thread = threading.Thread(target=self.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    def _should_fail(self) -> bool:
+        with self._lock:
+            self.requests += 1
+            if not self.error_rate:
+                return False
+            # Deterministic spread: fail every Nth request
+            return self.requests % max(1, round(1 / self.error_rate)) == 0
+
+    def answer(self, payload: dict) -> dict:
+        """Build the assistant reply for a valid payload"""
+        session_id = payload['session_id']
+        turn = self.memory.record(session_id, payload['message'], payload.get('request_id'))
+        if self.history_latency and not payload.get('history_included'):
+            # Simulate the agent loading ever more history as the session grows
+            time.sleep(self.history_latency * (turn - 1))
+        return {
+            'success': True,
+            'data': {
+                'message': f"Stub answer #{turn} to: {payload['message'][:200]}",
+                'session_id': session_id,
+            }
+        }
+
+    def answer_later(self, payload: dict, job_id: str):
+        """Async delivery: insert the user and assistant rows as the n8n flow would"""
+        def now():
+            return datetime.now(timezone.utc).isoformat()
+
+        base = {'session_id': payload['session_id'], 'user_id': payload['user_id']}
+        self.change_feed.insert(dict(base, id=str(uuid.uuid4()), role='user', content=payload['message'],
+                                     metadata={'job_id': job_id}, created_at=now()))
+        if self.latency:
+            time.sleep(self.latency)
+        reply = self.answer(payload)['data']['message']
+        self.change_feed.insert(dict(base, id=str(uuid.uuid4()), role='assistant', content=reply,
+                                     metadata={'job_id': job_id}, created_at=now()))
+
+    def _make_handler(self):
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, *args):
+                pass
+
+            def _reply(self, status: int, body: dict):
+                data = json.dumps(body).encode()
+                self.send_response(status)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def do_GET(self):
+                if self.path != '/realtime' or stub.change_feed is None:
+                    return self._reply(404, {'success': False, 'error': 'Not found'})
+
+                # Subscribe before answering, so the client is not told it is
+                # following the feed before it can receive events
+                events = queue.Queue()
+                stub.change_feed.subscribe(events.put)
+                try:
+                    self.send_response(200)
+                    self.send_header('Content-Type', 'application/x-ndjson')
+                    self.end_headers()
+                    while True:
+                        try:
+                            line = json.dumps(events.get(timeout=15)) + '\n'
+                        except queue.Empty:
+                            line = '\n'  # keep-alive, also detects a closed client
+                        self.wfile.write(line.encode())
+                        self.wfile.flush()
+                finally:
+                    stub.change_feed.unsubscribe(events.put)
+
+            def do_POST(self):
+                length = int(self.headers.get('Content-Length') or 0)
+                try:
+                    payload = json.loads(self.rfile.read(length) or b'{}')
+                except ValueError:
+                    return self._reply(400, {'success': False, 'error': 'Invalid JSON'})
+
+                missing = [field for field in REQUIRED_FIELDS if not payload.get(field)]
+                if missing:
+                    return self._reply(400, {'success': False, 'error': f"Missing or empty: {', '.join(missing)}"})
+
+                if payload.get('record_only'):
+                    # Turn answered from the app's FAQ cache: store it without running the agent
+                    stub.memory.record(payload['session_id'], payload['message'], payload.get('request_id'))
+                    return self._reply(200, {'success': True, 'data': {
+                        'message': payload.get('cached_answer'), 'session_id': payload['session_id'], 'recorded': True,
+                    }})
+
+                if stub.change_feed is not None:
+                    job_id = str(uuid.uuid4())
+                    threading.Thread(target=stub.answer_later, args=(payload, job_id), daemon=True).start()
+                    return self._reply(202, {'success': True, 'data': {'job_id': job_id, 'status': 'queued'}})
+
+                if stub.latency:
+                    time.sleep(stub.latency)
+                if stub._should_fail():
+                    return self._reply(500, {'success': False, 'error': 'Stub upstream failure'})
+
+                self._reply(200, stub.answer(payload))
+
+        return Handler
+
+
+if __name__ == '__main__':
+    import argparse
+
+    parser = argparse.ArgumentParser(description='Run the local chat webhook stand-in')
+    parser.add_argument('--port', type=int, default=5679)
+    parser.add_argument('--latency', type=float, default=0.0, help='Seconds to wait before answering')
+    parser.add_argument('--error-rate', type=float, default=0.0, help='Fraction of requests answered with HTTP 500')
+    parser.add_argument('--history-latency', type=float, default=0.0, help='Extra seconds per prior turn in the session')
+    parser.add_argument('--realtime', action='store_true',
+                        help='Ack with a job id and stream replies on /realtime (app: ANSWER_DELIVERY=realtime)')
+    args = parser.parse_args()
+
+    change_feed = None
+    if args.realtime:
+        from realtime_delivery import LocalChangeFeed
+        change_feed = LocalChangeFeed()
+
+    server = StubWebhookServer(port=args.port, latency=args.latency, error_rate=args.error_rate,
+                               history_latency=args.history_latency, change_feed=change_feed)
+    print(f"🧪 Stub webhook listening on {server.url}")
+    if args.realtime:
+        print(f"📡 Realtime feed: REALTIME_URL={server.realtime_url}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        server.stop()
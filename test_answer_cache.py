@@ -0,0 +1,43 @@
+"""Tests for the answer cache"""
+
+import time
+
+from answer_cache import AnswerCache, normalize_question
+
+
+def test_normalized_lookup():
+    cache = AnswerCache()
+    cache.set("What is VexaAI?", "An assistant")
+    assert normalize_question("  what IS vexaai ") == "what is vexaai"
+    assert cache.get("what is vexaai") == "An assistant"
+
+
+def test_scoped_entries_are_only_served_to_their_scope():
+    cache = AnswerCache()
+    cache.set("Tell me more", "for alice", scope="alice")
+    assert cache.get("Tell me more", scope="alice") == "for alice"
+    assert cache.get("Tell me more", scope="bob") is None
+    assert cache.get("Tell me more") is None
+
+
+def test_lru_eviction_and_ttl():
+    cache = AnswerCache(max_entries=2, ttl=0.05)
+    cache.set("a", "1")
+    cache.set("b", "2")
+    cache.get("a")
+    cache.set("c", "3")
+    assert "b" not in cache and "a" in cache
+    time.sleep(0.06)
+    assert cache.get("a") is None
+
+
+def test_snapshot_round_trip_and_refresh(tmp_path):
+    path = str(tmp_path / "cache.json")
+    cache = AnswerCache()
+    cache.set("What is VexaAI?", "An assistant")
+    cache.save(path)
+
+    other = AnswerCache()
+    assert other.load(path) == 1
+    assert other.get("what is vexaai") == "An assistant"
+    assert other.refresh(path) == 0
@@ -0,0 +1,127 @@
+"""Tests for the webhook circuit breaker"""
+
+import json
+import logging
+import time
+
+from circuit_breaker import CLOSED, HALF_OPEN, OPEN, CircuitBreaker, log_metrics
+
+
+def make_breaker(**overrides):
+    options = dict(window=60, min_requests=4, error_threshold=0.5, slow_call_seconds=1.0,
+                   slow_call_threshold=0.5, open_seconds=0.05, min_timeout=0.5, max_timeout=10)
+    options.update(overrides)
+    return CircuitBreaker(**options)
+
+
+def trip(breaker):
+    for _ in range(breaker.min_requests):
+        assert breaker.allow_request()
+        breaker.record(0.1, False)
+    assert breaker.state == OPEN
+
+
+def test_stays_closed_below_min_requests():
+    breaker = make_breaker()
+    for _ in range(3):
+        breaker.record(0.1, False)
+    assert breaker.state == CLOSED
+
+
+def test_error_rate_opens_and_rejects():
+    breaker = make_breaker()
+    trip(breaker)
+    assert not breaker.allow_request()
+    assert breaker.snapshot()['rejected'] == 1
+    assert breaker.trips == 1
+
+
+def test_slow_calls_open_the_circuit():
+    breaker = make_breaker()
+    for _ in range(4):
+        breaker.record(2.0, True)
+    assert breaker.state == OPEN
+
+
+def test_half_open_allows_limited_probes_then_closes():
+    breaker = make_breaker()
+    trip(breaker)
+    time.sleep(0.06)
+    assert breaker.allow_request()
+    assert breaker.state == HALF_OPEN
+    # Only one probe at a time
+    assert not breaker.allow_request()
+    breaker.record(0.1, True)
+    assert breaker.state == CLOSED
+    assert breaker.snapshot()['requests'] == 1
+
+
+def test_failed_probe_reopens():
+    breaker = make_breaker()
+    trip(breaker)
+    time.sleep(0.06)
+    assert breaker.allow_request()
+    breaker.record(0.1, False)
+    assert breaker.state == OPEN
+    assert breaker.trips == 2
+    assert not breaker.allow_request()
+
+
+def test_slow_probe_reopens():
+    breaker = make_breaker()
+    trip(breaker)
+    time.sleep(0.06)
+    assert breaker.allow_request()
+    breaker.record(5.0, True)
+    assert breaker.state == OPEN
+
+
+def test_timeout_uses_max_until_enough_samples():
+    breaker = make_breaker()
+    breaker.record(0.4, True)
+    assert breaker.timeout() == 10
+
+
+def test_timeout_adapts_to_p99_within_bounds():
+    breaker = make_breaker()
+    for latency in (0.5, 0.6, 0.7, 0.8, 1.0):
+        breaker.record(latency, True)
+    assert breaker.timeout() == round(2 * 0.992, 2)
+
+    fast = make_breaker()
+    for _ in range(5):
+        fast.record(0.01, True)
+    assert fast.timeout() == 0.5
+
+    slow = make_breaker(slow_call_seconds=100)
+    for _ in range(5):
+        slow.record(8.0, True)
+    assert slow.timeout() == 10
+
+
+def test_timeout_ignores_failed_calls():
+    breaker = make_breaker(min_requests=2, error_threshold=1.1)
+    breaker.record(0.3, True)
+    breaker.record(0.3, True)
+    breaker.record(9.0, False)
+    assert breaker.timeout() == 0.6
+
+
+def test_transitions_are_logged(caplog):
+    breaker = make_breaker()
+    with caplog.at_level(logging.WARNING, logger='circuit_breaker'):
+        trip(breaker)
+    assert "closed -> open" in caplog.text
+
+
+def test_log_metrics_emits_snapshot(caplog):
+    breaker = make_breaker()
+    breaker.record(0.2, True)
+    with caplog.at_level(logging.INFO, logger='circuit_breaker'):
+        stop = log_metrics(breaker, interval=0.02)
+        time.sleep(0.1)
+        stop.set()
+    lines = [r.getMessage() for r in caplog.records if r.getMessage().startswith('circuit_breaker ')]
+    assert lines
+    snapshot = json.loads(lines[0].split(' ', 1)[1])
+    assert snapshot['state'] == CLOSED and snapshot['requests'] == 1
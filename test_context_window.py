@@ -0,0 +1,45 @@
+"""Tests for the token-budgeted context window"""
+
+from context_window import ContextWindow, add_context, approx_tokens
+
+
+def conversation(turns: int, text: str = 'x' * 40) -> list:
+    return [{"role": "user" if i % 2 == 0 else "assistant", "content": f"{i} {text}"} for i in range(turns)]
+
+
+def test_oldest_turns_are_dropped_to_fit_budget():
+    messages = conversation(20)
+    per_message = approx_tokens(messages[0]["content"])
+    window = ContextWindow(budget=per_message * 5).sync(messages)
+    assert len(window) == 5
+    assert window.total <= window.budget
+    assert [m["content"] for m in window.to_payload()] == [m["content"] for m in messages[-5:]]
+
+
+def test_running_total_matches_kept_turns():
+    window = ContextWindow(budget=100).sync(conversation(30))
+    assert window.total == sum(approx_tokens(m["content"]) for m in window.to_payload())
+    assert window.seen == 30
+
+
+def test_sync_only_appends_new_messages():
+    messages = conversation(4)
+    window = ContextWindow(budget=10_000).sync(messages, upto=2)
+    messages += conversation(2, text='new')
+    window.sync(messages, upto=5)
+    assert window.seen == 5
+    assert len(window) == 5
+
+
+def test_sync_rebuilds_after_conversation_was_cleared():
+    window = ContextWindow(budget=10_000).sync(conversation(6))
+    fresh = [{"role": "user", "content": "hello again"}]
+    window.sync(fresh)
+    assert window.seen == 1
+    assert window.to_payload() == fresh
+
+
+def test_zero_budget_sends_empty_history():
+    payload = add_context({"message": "hi"}, ContextWindow(0).sync(conversation(3)))
+    assert payload["history"] == []
+    assert payload["history_included"] is True
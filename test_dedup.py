@@ -0,0 +1,100 @@
+"""Tests for near-duplicate chunk detection"""
+
+import pytest
+
+from dedup import Deduplicator, LSHIndex
+
+TEXT = ("The quarterly report covers revenue growth in every region, the hiring plan for the "
+        "support team and the roadmap for the knowledge assistant over the next two quarters")
+OTHER = ("Onboarding checklist for new engineers including laptop setup, access requests, "
+         "code review etiquette, on call rotation and the first week reading list")
+
+
+def chunk(chunk_id: str, text: str) -> dict:
+    return {'id': chunk_id, 'text': text}
+
+
+def test_near_copy_is_linked_to_original():
+    dedup = Deduplicator()
+    first, copy = dedup.process([chunk('a', TEXT), chunk('b', TEXT.replace('every', 'each'))])
+    assert first['duplicate_of'] is None
+    assert copy['duplicate_of'] == 'a'
+    assert dedup.report()['duplicates'] == 1
+
+
+def test_resent_chunk_is_already_indexed_not_its_own_duplicate():
+    dedup = Deduplicator()
+    dedup.process([chunk('a', TEXT)])
+    (again,) = dedup.process([chunk('a', TEXT)])
+    assert again['duplicate_of'] is None
+    assert again['already_indexed'] is True
+    assert dedup.report()['duplicates'] == 0
+
+
+def test_repeated_label_in_batch_gets_first_result():
+    results = Deduplicator().process([chunk('a', TEXT), chunk('a', TEXT)])
+    assert [c['duplicate_of'] for c in results] == [None, None]
+    with pytest.raises(ValueError):
+        Deduplicator().process([chunk('a', TEXT), chunk('a', OTHER)])
+
+
+def test_changed_chunk_replaces_its_old_entry():
+    dedup = Deduplicator()
+    dedup.process([chunk('a', TEXT)])
+    (changed,) = dedup.process([chunk('a', OTHER)])
+    assert changed['already_indexed'] is False
+    assert changed['duplicate_of'] is None
+    # The old text is no longer indexed, so a copy of it is new again
+    (copy,) = dedup.process([chunk('b', TEXT)])
+    assert copy['duplicate_of'] is None
+
+
+def test_removed_document_is_forgotten_and_persisted(tmp_path):
+    dedup = Deduplicator()
+    dedup.process([chunk('doc1:0', TEXT), chunk('doc2:0', OTHER)])
+    index = dedup.index
+    assert index.remove(index.labels_with_prefix('doc1:')) == []
+    assert 'doc1:0' not in index and 'doc2:0' in index
+
+    path = str(tmp_path / 'index.npz')
+    index.save(path)
+    loaded = LSHIndex.load(path)
+    assert 'doc1:0' not in loaded
+    reloaded = Deduplicator(loaded)
+    copy, other = reloaded.process([chunk('c', TEXT), chunk('doc2:0', OTHER)])
+    assert copy['duplicate_of'] is None
+    assert other['already_indexed'] is True
+
+
+def test_resent_duplicate_is_not_counted_again(tmp_path):
+    dedup = Deduplicator()
+    dedup.process([chunk('old:0', TEXT), chunk('new:0', TEXT)])
+    path = str(tmp_path / 'index.npz')
+    dedup.index.save(path)
+
+    resync = Deduplicator(LSHIndex.load(path))
+    (again,) = resync.process([chunk('new:0', TEXT)])
+    assert again['duplicate_of'] == 'old:0'
+    assert again['already_indexed'] is True
+    assert resync.report()['duplicates'] == 0
+    assert resync.report()['embedding_calls_saved'] == 0
+
+
+def test_removing_an_original_hands_back_its_duplicates():
+    dedup = Deduplicator()
+    dedup.process([chunk('old:0', TEXT), chunk('new:0', TEXT.replace('every', 'each'))])
+    index = dedup.index
+    assert index.labels_with_prefix('new:') == ['new:0']
+
+    assert index.remove(index.labels_with_prefix('old:')) == ['new:0']
+    assert 'new:0' not in index
+    # Sent again, the former duplicate is now the chunk to embed
+    (resent,) = dedup.process([chunk('new:0', TEXT.replace('every', 'each'))])
+    assert resent['duplicate_of'] is None and resent['already_indexed'] is False
+
+
+def test_changed_original_orphans_its_duplicates():
+    dedup = Deduplicator()
+    dedup.process([chunk('a', TEXT), chunk('b', TEXT)])
+    dedup.process([chunk('a', OTHER)])
+    assert dedup.index.orphaned == ['b']
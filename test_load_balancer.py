@@ -0,0 +1,146 @@
+"""Tests for endpoint picking, failover and hedging"""
+
+import time
+
+import pytest
+import requests
+
+from load_balancer import LEAST_OUTSTANDING, LoadBalancer, parse_webhook_urls
+from stub_webhook import ChatMemory, StubWebhookServer
+from webhook import make_payload
+
+
+@pytest.fixture
+def stubs():
+    servers = []
+
+    def start(**options):
+        server = StubWebhookServer(**options).start()
+        servers.append(server)
+        return server
+
+    yield start
+    for server in servers:
+        server.stop()
+
+
+def prefer(balancer, index):
+    """Make endpoint `index` the cheapest pick"""
+    for i, endpoint in enumerate(balancer.endpoints):
+        endpoint.ewma = 0.001 if i == index else 10.0
+        endpoint._last_update = time.monotonic()
+
+
+def wait_until(condition, timeout=2.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if condition():
+            return True
+        time.sleep(0.01)
+    return condition()
+
+
+def test_parse_webhook_urls():
+    assert parse_webhook_urls("http://a, http://b  http://c") == ["http://a", "http://b", "http://c"]
+    assert parse_webhook_urls(None) == []
+    with pytest.raises(ValueError):
+        LoadBalancer([])
+
+
+def test_pick_prefers_low_latency_and_skips_unhealthy():
+    balancer = LoadBalancer(["http://a", "http://b"])
+    prefer(balancer, 1)
+    assert balancer.pick().url == "http://b"
+
+    fast = balancer.endpoints[1]
+    fast.consecutive_failures = fast.failure_threshold
+    fast.last_failure = time.monotonic()
+    assert balancer.pick().url == "http://a"
+
+    # With every endpoint unhealthy, still pick one rather than fail
+    slow = balancer.endpoints[0]
+    slow.consecutive_failures = slow.failure_threshold
+    slow.last_failure = time.monotonic()
+    assert balancer.pick() is not None
+
+
+def test_least_outstanding():
+    balancer = LoadBalancer(["http://a", "http://b"], strategy=LEAST_OUTSTANDING)
+    balancer.endpoints[0].outstanding = 2
+    assert balancer.pick().url == "http://b"
+
+
+def test_fails_over_to_another_endpoint(stubs):
+    broken = stubs(error_rate=1.0)
+    healthy = stubs()
+    balancer = LoadBalancer([broken.url, healthy.url], hedge=True)
+    prefer(balancer, 0)
+
+    response = balancer.post(make_payload("What is VexaAI?"), timeout=5)
+    assert response.status_code == 200
+    assert broken.requests == 1
+    assert balancer.endpoints[0].errors == 1
+
+
+def test_without_hedging_errors_are_returned(stubs):
+    broken = stubs(error_rate=1.0)
+    healthy = stubs()
+    balancer = LoadBalancer([broken.url, healthy.url])
+    prefer(balancer, 0)
+    assert balancer.post(make_payload("hi"), timeout=5).status_code == 500
+    assert healthy.requests == 0
+
+
+def test_hedge_aborts_the_slow_attempt(stubs):
+    memory = ChatMemory()
+    slow = stubs(latency=1.0, memory=memory)
+    fast = stubs(latency=0.05, memory=memory)
+    balancer = LoadBalancer([slow.url, fast.url], hedge=True, hedge_min_samples=1)
+    balancer._recent.extend([0.1] * 5)
+    prefer(balancer, 0)
+
+    payload = make_payload("What is VexaAI?")
+    start = time.perf_counter()
+    response = balancer.post(payload, timeout=5)
+    assert response.status_code == 200
+    assert time.perf_counter() - start < 0.8
+    assert balancer.endpoints[1].hedges_won == 1
+
+    # The losing connection is shut down, not left running in the background
+    assert wait_until(lambda: balancer.endpoints[0].outstanding == 0, timeout=0.5)
+    assert balancer.endpoints[0].cancelled == 1
+
+    # Both workers ran the request, but the shared memory dedupes on request_id
+    time.sleep(1.2)
+    assert memory.sessions[payload["session_id"]] == ["What is VexaAI?"]
+
+
+def test_queued_attempts_are_cancelled(stubs):
+    slow = stubs(latency=1.0)
+    fast = stubs()
+    # One worker: the hedge is still queued behind the primary when the call gives up
+    balancer = LoadBalancer([slow.url, fast.url], hedge=True, hedge_min_samples=1, max_workers=1)
+    balancer._recent.extend([0.05] * 5)
+    prefer(balancer, 0)
+
+    with pytest.raises(requests.exceptions.RequestException):
+        balancer.post(make_payload("hi"), timeout=0.3)
+    time.sleep(1.2)
+    assert fast.requests == 0
+    assert balancer.endpoints[1].requests == 0
+    assert balancer.endpoints[0].outstanding == 0
+
+
+def test_cold_balancer_does_not_hedge_at_the_deadline(stubs):
+    slow = stubs(latency=1.0)
+    fast = stubs()
+    # No p95 yet, so a timeout must not fire a last-moment hedge
+    balancer = LoadBalancer([slow.url, fast.url], hedge=True, hedge_min_samples=20)
+    prefer(balancer, 0)
+
+    with pytest.raises(requests.exceptions.RequestException):
+        balancer.post(make_payload("hi"), timeout=0.3)
+    assert balancer.hedge_delay() is None
+    assert balancer.hedged == 0
+    assert balancer.endpoints[1].requests == 0
+    assert fast.requests == 0
@@ -0,0 +1,102 @@
+"""Tests for per-rerun profiling"""
+
+import json
+import os
+import threading
+import time
+
+import pytest
+
+import profiling
+from profiling import FULL, OFF, SAMPLE, RerunProfile, StackSampler, start_rerun
+
+
+def busy(seconds: float):
+    end = time.perf_counter() + seconds
+    while time.perf_counter() < end:
+        pass
+
+
+def test_sampler_folds_stacks_root_first():
+    sampler = StackSampler(threading.get_ident(), interval=0.001)
+    sampler.start()
+    busy(0.05)
+    sampler.stop()
+    lines = sampler.folded().splitlines()
+    assert lines
+    stack, count = lines[0].rsplit(' ', 1)
+    assert int(count) >= 1
+    assert 'busy (test_profiling.py' in stack
+    assert stack.index('test_sampler_folds_stacks_root_first') < stack.index('busy (')
+
+
+def test_breakdown_accounts_for_unsectioned_time():
+    profile = RerunProfile(OFF)
+    with profile.section('network'):
+        time.sleep(0.02)
+    with profile.section('network'):
+        time.sleep(0.01)
+    time.sleep(0.01)
+    breakdown = profile.finish()
+    assert breakdown['network'] >= 30
+    assert breakdown['other'] >= 10
+    assert breakdown['total'] == pytest.approx(breakdown['network'] + breakdown['other'], abs=0.05)
+    # finish() is idempotent
+    assert profile.finish() == breakdown
+
+
+def test_unprofiled_rerun_writes_nothing(tmp_path):
+    RerunProfile(OFF, directory=str(tmp_path)).finish()
+    assert os.listdir(tmp_path) == []
+
+
+@pytest.mark.parametrize('mode, suffix', [(SAMPLE, '.folded'), (FULL, '.prof')])
+def test_profiled_rerun_writes_profile_and_timings(tmp_path, mode, suffix):
+    profile = RerunProfile(mode, directory=str(tmp_path), interval=0.001)
+    with profile.section('render'):
+        busy(0.02)
+    profile.finish()
+
+    files = os.listdir(tmp_path)
+    assert sum(f.endswith(suffix) for f in files) == 1
+    with open(tmp_path / 'reruns.jsonl') as f:
+        record = json.loads(f.readline())
+    assert record['mode'] == mode
+    assert set(record['ms']) == {'render', 'other', 'total'}
+
+
+def test_only_one_full_profile_at_a_time(tmp_path):
+    first = RerunProfile(FULL, directory=str(tmp_path))
+    second = RerunProfile(FULL, directory=str(tmp_path))
+    assert first.mode == FULL
+    assert second.mode == OFF
+    second.finish()
+    first.finish()
+    assert RerunProfile(FULL, directory=str(tmp_path)).mode == FULL
+
+
+def test_profiler_conflict_falls_back_to_timers(monkeypatch):
+    class Busy:
+        def enable(self):
+            raise ValueError('Another profiling tool is already active')
+
+    monkeypatch.setattr(profiling.cProfile, 'Profile', Busy)
+    profile = RerunProfile(FULL)
+    assert profile.mode == OFF
+    assert not profiling._full_profile_lock.locked()
+
+
+def test_start_rerun_selection(monkeypatch, tmp_path):
+    monkeypatch.setenv('PROFILE_DIR', str(tmp_path))
+    monkeypatch.setenv('PROFILE_MODE', 'sample')
+    monkeypatch.setenv('PROFILE_RATE', '1')
+    profile = start_rerun()
+    assert profile.mode == SAMPLE
+    profile.finish()
+
+    monkeypatch.setenv('PROFILE_RATE', '0')
+    assert start_rerun().mode == OFF
+
+    monkeypatch.setenv('PROFILE_MODE', 'bogus')
+    monkeypatch.setenv('PROFILE_RATE', '1')
+    assert start_rerun().mode == OFF
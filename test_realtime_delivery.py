@@ -0,0 +1,86 @@
+"""Tests for push-based answer delivery"""
+
+import time
+
+import requests
+
+from realtime_delivery import AnswerMailbox, LocalChangeFeed, RealtimeListener, change_payload, local_feed
+from stub_webhook import StubWebhookServer
+
+
+def reply(session_id: str, job_id: str, content: str = 'answer', role: str = 'assistant') -> dict:
+    return change_payload({'session_id': session_id, 'role': role, 'content': content,
+                           'metadata': {'job_id': job_id}})
+
+
+def wait_for(predicate, timeout: float = 5):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        result = predicate()
+        if result:
+            return result
+        time.sleep(0.02)
+    return None
+
+
+def test_reply_is_taken_by_job_id():
+    mailbox = AnswerMailbox()
+    mailbox.expect('s1')
+    mailbox.deliver(reply('s1', 'job-b', 'second'))
+    mailbox.deliver(reply('s1', 'job-a', 'first'))
+    assert mailbox.take('s1', 'job-a')['content'] == 'first'
+
+
+def test_late_reply_to_earlier_job_is_not_served():
+    mailbox = AnswerMailbox()
+    mailbox.expect('s1')
+    mailbox.deliver(reply('s1', 'timed-out-job', 'stale'))
+    assert mailbox.take('s1', 'current-job') is None
+    mailbox.deliver(reply('s1', 'current-job', 'fresh'))
+    assert mailbox.take('s1', 'current-job')['content'] == 'fresh'
+    assert mailbox.snapshot()['waiting_sessions'] == 0
+
+
+def test_unexpected_user_and_unlabelled_rows_are_dropped():
+    mailbox = AnswerMailbox()
+    mailbox.expect('s1')
+    mailbox.deliver(reply('other', 'job'))
+    mailbox.deliver(reply('s1', 'job', role='user'))
+    mailbox.deliver(change_payload({'session_id': 's1', 'role': 'assistant', 'content': 'no job id'}))
+    assert mailbox.snapshot()['dropped'] == 3
+    assert mailbox.take('s1', 'job') is None
+
+
+def ask(stub, session_id: str) -> str:
+    payload = {'message': 'What is VexaAI?', 'session_id': session_id, 'user_id': 'u1', 'delivery': 'realtime'}
+    response = requests.post(stub.url, json=payload, timeout=5)
+    assert response.status_code == 202
+    return response.json()['data']['job_id']
+
+
+def test_in_process_feed_end_to_end():
+    mailbox = AnswerMailbox()
+    listener = RealtimeListener('local://', None, mailbox).start()
+    try:
+        with StubWebhookServer(change_feed=local_feed) as stub:
+            mailbox.expect('s1')
+            job_id = ask(stub, 's1')
+            record = wait_for(lambda: mailbox.take('s1', job_id))
+        assert record['content'].startswith('Stub answer #1')
+    finally:
+        local_feed.unsubscribe(mailbox.deliver)
+        listener.stop()
+
+
+def test_stub_feed_over_http_end_to_end():
+    mailbox = AnswerMailbox()
+    with StubWebhookServer(change_feed=LocalChangeFeed()) as stub:
+        listener = RealtimeListener(stub.realtime_url, None, mailbox).start()
+        try:
+            assert wait_for(lambda: listener.status == 'stub')
+            mailbox.expect('s1')
+            job_id = ask(stub, 's1')
+            record = wait_for(lambda: mailbox.take('s1', job_id))
+        finally:
+            listener.stop()
+    assert record['metadata']['job_id'] == job_id
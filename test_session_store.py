@@ -0,0 +1,111 @@
+"""Tests for the shared session store"""
+
+import time
+
+import pytest
+
+from session_store import (
+    DiskBackend, MemoryBackend, SessionStore, create_session_store, decode_state, encode_state, store_key,
+)
+
+STATE = {'session_id': 's1', 'messages': [{'role': 'user', 'content': 'hi'}], 'authenticated': True,
+         'user_id': 'u1', '_private': 'not persisted'}
+
+
+@pytest.fixture
+def store():
+    store = SessionStore(MemoryBackend(), ttl=60, flush_interval=3600)
+    yield store
+    store.close()
+
+
+def test_encode_keeps_only_persisted_keys():
+    state = decode_state(encode_state(STATE))
+    assert state['messages'] == STATE['messages']
+    assert '_private' not in state
+
+
+def test_write_behind_until_flush(store):
+    store.save('k', STATE)
+    assert store.backend.get('k') is None
+    # Pending writes are already visible to load()
+    assert store.load('k')['user_id'] == 'u1'
+    store.flush()
+    assert decode_state(store.backend.get('k'))['user_id'] == 'u1'
+
+
+def test_background_flush_batches_writes():
+    store = SessionStore(MemoryBackend(), ttl=60, flush_interval=0.05)
+    try:
+        for i in range(3):
+            store.save(f"k{i}", STATE)
+        time.sleep(0.3)
+        assert all(store.backend.get(f"k{i}") for i in range(3))
+    finally:
+        store.close()
+
+
+def test_batch_size_triggers_early_flush():
+    store = SessionStore(MemoryBackend(), ttl=60, flush_interval=3600, batch_size=2)
+    try:
+        store.save('a', STATE)
+        store.save('b', STATE)
+        time.sleep(0.2)
+        assert store.backend.get('a') and store.backend.get('b')
+    finally:
+        store.close()
+
+
+def test_memory_ttl_expires_entries(store):
+    store.backend.set_many({'k': encode_state(STATE)}, ttl=-1)
+    assert store.load('k') is None
+
+
+def test_disk_ttl_expires_entries(tmp_path):
+    backend = DiskBackend(str(tmp_path), ttl=60)
+    backend.set_many({'k': b'blob'}, ttl=60)
+    assert backend.get('k') == b'blob'
+    backend.ttl = -1
+    assert backend.get('k') is None
+
+
+def test_delete_drops_pending_and_stored(store):
+    store.save('k', STATE)
+    store.flush()
+    store.save('k', STATE)
+    store.delete('k')
+    store.flush()
+    assert store.load('k') is None
+
+
+def test_failed_flush_is_retried(store):
+    calls = []
+
+    def fail_once(items, ttl):
+        calls.append(items)
+        if len(calls) == 1:
+            raise ConnectionError('down')
+        MemoryBackend.set_many(store.backend, items, ttl)
+
+    store.backend.set_many = fail_once
+    store.save('k', STATE)
+    store.flush()
+    assert store.backend.get('k') is None
+    store.flush()
+    assert store.load('k')['session_id'] == 's1'
+
+
+def test_store_key_requires_a_long_cookie():
+    token = 'a' * 32
+    assert store_key({'vexaai_sid': token}) == store_key({'vexaai_sid': token})
+    assert store_key({'vexaai_sid': token}) != token
+    assert store_key({'vexaai_sid': 'short'}) is None
+    assert store_key({}) is None
+
+
+def test_create_session_store_schemes(tmp_path):
+    store = create_session_store(f"file://{tmp_path}/sessions", ttl=10)
+    assert isinstance(store.backend, DiskBackend)
+    store.close()
+    with pytest.raises(ValueError):
+        create_session_store('ftp://nowhere')
@@ -0,0 +1,47 @@
+"""Tests for the soak runner against the local stand-in"""
+
+import pytest
+
+from soak import SoakRun, drift, start_stub_process
+from stub_webhook import StubWebhookServer
+
+
+@pytest.fixture(scope='module')
+def stub_url():
+    with StubWebhookServer() as stub:
+        yield stub.url
+
+
+def test_without_duration_runs_the_fixed_pool(stub_url):
+    report = SoakRun(stub_url, sessions=3, turns=2, concurrency=2, interval=1).run()
+    assert report['sessions_started'] == 3
+    assert report['overall']['count'] == 6
+
+
+def test_duration_keeps_starting_sessions_until_deadline(stub_url):
+    report = SoakRun(stub_url, sessions=1, turns=2, concurrency=2, duration=0.5, interval=1).run()
+    assert report['elapsed_s'] >= 0.5
+    assert report['sessions_started'] > 1
+    assert report['error_rate'] == 0.0
+
+
+def test_drift_finds_trim_point():
+    by_turn = {
+        1: {'p50_ms': 10, 'p95_ms': 10},
+        11: {'p50_ms': 12, 'p95_ms': 12},
+        21: {'p50_ms': 20, 'p95_ms': 30},
+    }
+    result = drift(by_turn)
+    assert result['ms_per_turn'] > 0
+    assert result['trim_history_after_turn'] == 21
+
+
+def test_default_stub_runs_outside_the_client_process():
+    process, url = start_stub_process()
+    try:
+        report = SoakRun(url, sessions=2, turns=3, concurrency=2, interval=1).run()
+        assert report['error_rate'] == 0.0
+        assert report['overall']['count'] == 6
+    finally:
+        process.terminate()
+        process.wait()
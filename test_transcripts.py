@@ -0,0 +1,61 @@
+"""Round-trip tests for transcript export formats"""
+
+import itertools
+
+import pytest
+
+from transcripts import read_messages, synthetic_messages, write_jsonl, write_parquet
+
+pytest.importorskip('pyarrow')
+
+
+@pytest.mark.parametrize('suffix', ['jsonl', 'parquet'])
+def test_round_trip(tmp_path, suffix):
+    rows = list(synthetic_messages(120))
+    path = str(tmp_path / f"chats.{suffix}")
+    if suffix == 'parquet':
+        assert write_parquet(rows, path, batch_size=50) == 120
+    else:
+        assert write_jsonl(rows, path) == 120
+    assert list(read_messages(path, batch_size=50)) == rows
+
+
+def test_parquet_keeps_types_and_late_nested_values(tmp_path):
+    rows = [
+        {'id': '1', 'n': 1, 'score': 0.5, 'flag': True, 'metadata': None, 'extra': None},
+        {'id': '2', 'n': 2, 'score': 1.5, 'flag': False, 'metadata': {'a': 1}, 'extra': None},
+        {'id': '3', 'n': None, 'score': None, 'flag': None, 'metadata': None, 'extra': [1, 'x']},
+        {'id': '4', 'n': 4, 'score': 2.0, 'flag': True, 'metadata': 'plain', 'extra': 7},
+    ]
+    path = str(tmp_path / 'chats.parquet')
+    # First batch has every metadata/extra value null; later batches hold dicts, lists and scalars
+    write_parquet(rows, path, batch_size=1)
+    assert list(read_messages(path)) == rows
+
+
+def test_parquet_mixed_numbers_round_trip(tmp_path):
+    rows = [{'id': '1', 'value': 1}, {'id': '2', 'value': 2.5}]
+    path = str(tmp_path / 'chats.parquet')
+    write_parquet(rows, path)
+    result = list(read_messages(path))
+    assert result == rows
+    assert isinstance(result[0]['value'], int)
+
+
+def test_parquet_rejects_type_change_after_first_batch(tmp_path):
+    rows = [{'id': '1', 'n': 1}, {'id': '2', 'n': 'two'}]
+    with pytest.raises(ValueError, match="'n'"):
+        write_parquet(rows, str(tmp_path / 'chats.parquet'), batch_size=1)
+
+
+def test_parquet_rejects_new_columns(tmp_path):
+    rows = [{'id': '1'}, {'id': '2', 'late': 1}]
+    with pytest.raises(ValueError, match='late'):
+        write_parquet(rows, str(tmp_path / 'chats.parquet'), batch_size=1)
+
+
+def test_parquet_streams_in_batches(tmp_path):
+    path = str(tmp_path / 'chats.parquet')
+    write_parquet(synthetic_messages(250), path, batch_size=100)
+    first = list(itertools.islice(read_messages(path, batch_size=100), 3))
+    assert [row['role'] for row in first] == ['user', 'assistant', 'user']
@@ -0,0 +1,34 @@
+"""Tests for FAQ warm-up against the local stand-in"""
+
+import requests
+
+from answer_cache import AnswerCache
+from load_balancer import LoadBalancer
+from stub_webhook import StubWebhookServer
+from warmup import load_faq, warm_cache
+
+
+def test_load_faq_dedupes_normalized_questions(tmp_path):
+    faq = tmp_path / 'faq.txt'
+    faq.write_text("# comment\nWhat is VexaAI?\nwhat is vexaai\n\nHow do I reset my password?\n")
+    assert load_faq(str(faq), include_defaults=False) == ["What is VexaAI?", "How do I reset my password?"]
+
+
+def test_warm_cache_skips_cached_questions():
+    cache = AnswerCache()
+    cache.set("What is VexaAI?", "already warm")
+    with StubWebhookServer() as stub:
+        report = warm_cache(["What is VexaAI?", "Who are you?"], LoadBalancer([stub.url]), cache, concurrency=2)
+    assert report['warmed'] == 1 and report['skipped'] == 1
+    assert report['coverage'] == 1.0
+    assert cache.get("What is VexaAI?") == "already warm"
+    assert cache.get("who are you").startswith("Stub answer")
+
+
+def test_record_only_turn_is_stored_without_an_answer():
+    with StubWebhookServer() as stub:
+        payload = {'message': 'What is VexaAI?', 'session_id': 's1', 'user_id': 'u1',
+                   'record_only': True, 'cached_answer': 'warm answer'}
+        result = requests.post(stub.url, json=payload, timeout=5).json()
+        assert result['data']['message'] == 'warm answer'
+        assert stub.history == {'s1': ['What is VexaAI?']}
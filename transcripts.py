@@ -0,0 +1,343 @@
+"""
+Streaming export and import of chat transcripts (chat_messages)
+
+Pages through Supabase with keyset pagination on (created_at, id) and
+streams rows to JSONL or Parquet in bounded memory. The importer reads
+either format back and loads it with batched upserts.
+
+Usage:
+    python transcripts.py export chats.jsonl --user-id <uuid> --since 2025-01-01
+    python transcripts.py export chats.parquet
+    python transcripts.py import chats.parquet --batch-size 1000
+    python transcripts.py bench --rows 1000000
+"""
+
+import argparse
+import itertools
+import json
+import os
+import sys
+import time
+import tracemalloc
+import uuid
+from datetime import datetime, timedelta
+
+TABLE = 'chat_messages'
+PAGE_SIZE = 1000
+BATCH_SIZE = 500
+
+
+def batched(iterable, size: int):
+    """Yield lists of up to `size` items from iterable"""
+    iterator = iter(iterable)
+    while True:
+        batch = list(itertools.islice(iterator, size))
+        if not batch:
+            return
+        yield batch
+
+
+def _quote(value) -> str:
+    """Quote a value for use inside a PostgREST or() filter"""
+    return '"' + str(value).replace('"', '\\"') + '"'
+
+
+def iter_messages(supabase, page_size: int = PAGE_SIZE, user_id: str = None,
+                  since: str = None, until: str = None):
+    """
+    Yield chat_messages rows ordered by (created_at, id).
+
+    Uses keyset pagination, so each page is an index range scan regardless
+    of how deep into the table the export is.
+    """
+    last = None
+    while True:
+        query = supabase.table(TABLE).select('*')
+        if user_id:
+            query = query.eq('user_id', user_id)
+        if since:
+            query = query.gte('created_at', since)
+        if until:
+            query = query.lt('created_at', until)
+        if last:
+            created_at, row_id = _quote(last['created_at']), _quote(last['id'])
+            query = query.or_(f"created_at.gt.{created_at},and(created_at.eq.{created_at},id.gt.{row_id})")
+        result = query.order('created_at').order('id').limit(page_size).execute()
+
+        rows = result.data or []
+        yield from rows
+        if len(rows) < page_size:
+            return
+        last = rows[-1]
+
+
+# ----------------------------
+# JSONL
+# ----------------------------
+def write_jsonl(rows, path: str) -> int:
+    count = 0
+    with open(path, 'w', encoding='utf-8') as f:
+        for row in rows:
+            f.write(json.dumps(row, ensure_ascii=False, default=str))
+            f.write('\n')
+            count += 1
+    return count
+
+
+def read_jsonl(path: str):
+    with open(path, encoding='utf-8') as f:
+        for line in f:
+            if line.strip():
+                yield json.loads(line)
+
+
+# ----------------------------
+# Parquet (columnar)
+# ----------------------------
+def _require_pyarrow():
+    try:
+        import pyarrow
+        import pyarrow.parquet
+    except ImportError:
+        raise RuntimeError("Parquet support requires pyarrow: pip install pyarrow")
+    return pyarrow, pyarrow.parquet
+
+
+# Parquet type per kind of Python value; JSON columns are stored as JSON text
+_ARROW_KINDS = {bool: 'bool_', int: 'int64', float: 'float64', str: 'string'}
+JSON_KIND = 'json'
+
+
+def _value_kind(value):
+    return _ARROW_KINDS.get(type(value), JSON_KIND)
+
+
+def _column_kind(values) -> str:
+    """
+    Arrow type name for a column from all of its values in a batch.
+    Columns that are all null, nested or of mixed types are stored as
+    JSON, which reads back losslessly whatever later rows hold.
+    """
+    kinds = {_value_kind(v) for v in values if v is not None}
+    return kinds.pop() if len(kinds) == 1 else JSON_KIND
+
+
+def write_parquet(rows, path: str, batch_size: int = PAGE_SIZE) -> int:
+    """
+    Write rows to Parquet one row group per batch.
+
+    Column types are inferred from the first batch: booleans, integers,
+    floats and strings become typed columns; nested, mixed or all-null
+    columns are JSON-encoded and flagged in the file metadata so
+    read_parquet can decode them. Every later batch is checked against
+    that schema rather than silently coerced.
+    """
+    pa, pq = _require_pyarrow()
+    writer = None
+    kinds = None
+    count = 0
+
+    try:
+        for batch in batched(rows, batch_size):
+            if kinds is None:
+                columns = list(dict.fromkeys(key for row in batch for key in row))
+                kinds = {c: _column_kind([row.get(c) for row in batch]) for c in columns}
+                json_columns = sorted(c for c, kind in kinds.items() if kind == JSON_KIND)
+                schema = pa.schema(
+                    [(c, pa.string() if kind == JSON_KIND else getattr(pa, kind)()) for c, kind in kinds.items()],
+                    metadata={b'json_columns': json.dumps(json_columns).encode()}
+                )
+                writer = pq.ParquetWriter(path, schema, compression='zstd')
+
+            unknown = {key for row in batch for key in row} - kinds.keys()
+            if unknown:
+                raise ValueError(f"Columns {sorted(unknown)} first appear after row {count}; export to .jsonl instead")
+
+            arrays = []
+            for column, kind in kinds.items():
+                values = [row.get(column) for row in batch]
+                if kind == JSON_KIND:
+                    values = [None if v is None else json.dumps(v, ensure_ascii=False, default=str) for v in values]
+                else:
+                    mismatched = {_value_kind(v) for v in values if v is not None} - {kind}
+                    if mismatched:
+                        raise ValueError(f"Column {column!r} was typed {kind} from the first batch but rows "
+                                         f"{count + 1}-{count + len(batch)} hold {', '.join(sorted(mismatched))} "
+                                         f"values; export to .jsonl instead")
+                arrays.append(pa.array(values, type=schema.field(column).type))
+            writer.write_table(pa.Table.from_arrays(arrays, schema=schema))
+            count += len(batch)
+    finally:
+        if writer:
+            writer.close()
+    return count
+
+
+def read_parquet(path: str, batch_size: int = PAGE_SIZE):
+    _, pq = _require_pyarrow()
+    parquet = pq.ParquetFile(path)
+    file_metadata = parquet.schema_arrow.metadata or {}
+    json_columns = set(json.loads(file_metadata.get(b'json_columns', b'[]')))
+
+    for record_batch in parquet.iter_batches(batch_size=batch_size):
+        for row in record_batch.to_pylist():
+            for column in json_columns:
+                if row.get(column) is not None:
+                    row[column] = json.loads(row[column])
+            yield row
+
+
+def _is_parquet(path: str) -> bool:
+    return path.endswith(('.parquet', '.pq'))
+
+
+# ----------------------------
+# Export / Import
+# ----------------------------
+def export_messages(supabase, path: str, page_size: int = PAGE_SIZE, **filters) -> int:
+    rows = iter_messages(supabase, page_size=page_size, **filters)
+    if _is_parquet(path):
+        return write_parquet(rows, path, batch_size=page_size)
+    return write_jsonl(rows, path)
+
+
+def read_messages(path: str, batch_size: int = PAGE_SIZE):
+    if _is_parquet(path):
+        return read_parquet(path, batch_size=batch_size)
+    return read_jsonl(path)
+
+
+def import_messages(supabase, rows, batch_size: int = BATCH_SIZE) -> int:
+    """Load rows with batched upserts (idempotent on id)"""
+    count = 0
+    for batch in batched(rows, batch_size):
+        supabase.table(TABLE).upsert(batch).execute()
+        count += len(batch)
+    return count
+
+
+# ----------------------------
+# Benchmark
+# ----------------------------
+def synthetic_messages(count: int):
+    """Yield realistic-looking chat_messages rows without touching Supabase"""
+    start = datetime(2025, 1, 1)
+    session_id = user_id = None
+    for i in range(count):
+        if i % 50 == 0:
+            session_id, user_id = str(uuid.uuid4()), str(uuid.uuid4())
+        role = 'user' if i % 2 == 0 else 'assistant'
+        yield {
+            'id': str(uuid.uuid4()),
+            'session_id': session_id,
+            'user_id': user_id,
+            'role': role,
+            'content': ("What is VexaAI? " if role == 'user' else "VexaAI is your team's knowledge assistant. ") * 4,
+            'metadata': {'role': role, 'source': 'bench'},
+            'created_at': (start + timedelta(seconds=i)).isoformat(),
+        }
+
+
+def _measure(label: str, func, trace_memory: bool = False) -> dict:
+    """Run func (returning a row count) and report throughput; tracemalloc adds overhead, so it is opt-in"""
+    if trace_memory:
+        tracemalloc.start()
+    start = time.perf_counter()
+    count = func()
+    elapsed = time.perf_counter() - start
+    result = {
+        'step': label,
+        'rows': count,
+        'seconds': round(elapsed, 3),
+        'rows_per_s': round(count / elapsed) if elapsed else None,
+    }
+    line = f"⏱️  {label:<16} {count:>10,} rows  {result['rows_per_s'] or 0:>10,} rows/s"
+    if trace_memory:
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        result['peak_mb'] = round(peak / (1024 * 1024), 2)
+        line += f"  peak {result['peak_mb']} MB"
+    print(line)
+    return result
+
+
+def benchmark(rows: int, directory: str, batch_size: int = PAGE_SIZE, trace_memory: bool = False) -> list:
+    """Measure serialization throughput and peak memory for each format"""
+    results = []
+    for suffix in ('jsonl', 'parquet'):
+        path = os.path.join(directory, f"bench_transcripts.{suffix}")
+        if suffix == 'parquet':
+            write = lambda: write_parquet(synthetic_messages(rows), path, batch_size=batch_size)
+        else:
+            write = lambda: write_jsonl(synthetic_messages(rows), path)
+        results.append(_measure(f"export {suffix}", write, trace_memory))
+        results.append(_measure(f"read {suffix}", lambda: sum(1 for _ in read_messages(path, batch_size)), trace_memory))
+        results[-1]['file_mb'] = round(os.path.getsize(path) / (1024 * 1024), 2)
+        os.remove(path)
+    return results
+
+
+def _supabase_client():
+    from dotenv import load_dotenv
+    from supabase import create_client
+
+    load_dotenv()
+    return create_client(os.getenv("SUPABASE_URL"), os.getenv("SUPABASE_KEY"))
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Export and import chat transcripts')
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    export_cmd = commands.add_parser('export', help='Stream chat_messages to .jsonl or .parquet')
+    export_cmd.add_argument('path')
+    export_cmd.add_argument('--user-id')
+    export_cmd.add_argument('--since', help='Inclusive lower bound on created_at (ISO date/time)')
+    export_cmd.add_argument('--until', help='Exclusive upper bound on created_at (ISO date/time)')
+    export_cmd.add_argument('--page-size', type=int, default=PAGE_SIZE)
+
+    import_cmd = commands.add_parser('import', help='Load a .jsonl or .parquet export back into chat_messages')
+    import_cmd.add_argument('path')
+    import_cmd.add_argument('--batch-size', type=int, default=BATCH_SIZE)
+
+    bench_cmd = commands.add_parser('bench', help='Benchmark export/import throughput')
+    bench_cmd.add_argument('--rows', type=int, default=100_000)
+    bench_cmd.add_argument('--dir', default='.')
+    bench_cmd.add_argument('--batch-size', type=int, default=PAGE_SIZE)
+    bench_cmd.add_argument('--trace-memory', action='store_true',
+                           help='Also report peak Python heap per step (slows the run down)')
+    bench_cmd.add_argument('--live', action='store_true',
+                           help='Also benchmark a real export/import round trip against Supabase')
+    bench_cmd.add_argument('--report', help='Write results as JSON to this path')
+
+    args = parser.parse_args()
+
+    if args.command == 'export':
+        client = _supabase_client()
+        _measure('export', lambda: export_messages(
+            client, args.path, page_size=args.page_size,
+            user_id=args.user_id, since=args.since, until=args.until
+        ))
+        print(f"✅ Exported to {args.path}")
+
+    elif args.command == 'import':
+        client = _supabase_client()
+        _measure('import', lambda: import_messages(client, read_messages(args.path), batch_size=args.batch_size))
+        print(f"✅ Imported {args.path}")
+
+    elif args.command == 'bench':
+        results = benchmark(args.rows, args.dir, batch_size=args.batch_size, trace_memory=args.trace_memory)
+        if args.live:
+            client = _supabase_client()
+            path = os.path.join(args.dir, 'bench_live.jsonl')
+            results.append(_measure('live export', lambda: export_messages(client, path, page_size=args.batch_size)))
+            results.append(_measure('live import', lambda: import_messages(client, read_jsonl(path), batch_size=args.batch_size)))
+            os.remove(path)
+        if args.report:
+            with open(args.report, 'w') as f:
+                json.dump(results, f, indent=2)
+            print(f"📝 Report written: {args.report}")
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,135 @@
+"""
+Answer cache warm-up for VexaAI
+
+Precomputes answers to the most common questions through the normal
+webhook path, with bounded concurrency, and writes them to the answer
+cache snapshot that app.py loads at startup. Run it before the replica
+starts serving (or on a schedule with --interval).
+
+Usage:
+    python warmup.py --faq faq.txt --concurrency 4
+    python warmup.py --interval 3600 --min-coverage 0.8
+"""
+
+import argparse
+import json
+import os
+import sys
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import datetime
+
+from dotenv import load_dotenv
+
+from answer_cache import AnswerCache, normalize_question
+from load_balancer import create_load_balancer
+from webhook import PROMPTS, make_payload
+
+WARMUP_USER_ID = str(uuid.uuid5(uuid.NAMESPACE_URL, 'vexaai-cache-warmup'))
+
+
+def load_faq(path: str, include_defaults: bool = True) -> list:
+    """Read questions (one per line, '#' comments) and de-duplicate by normalized form"""
+    questions = list(PROMPTS) if include_defaults else []
+    if path and os.path.exists(path):
+        with open(path, encoding='utf-8') as f:
+            questions += [line.strip() for line in f if line.strip() and not line.lstrip().startswith('#')]
+
+    seen = set()
+    unique = []
+    for question in questions:
+        key = normalize_question(question)
+        if key and key not in seen:
+            seen.add(key)
+            unique.append(question)
+    return unique
+
+
+def ask(balancer, question: str, timeout: float) -> str:
+    """Send one question as the first turn of a fresh session, like a new user would"""
+    payload = make_payload(question, user_id=WARMUP_USER_ID)
+    response = balancer.post(payload, timeout=timeout)
+    response.raise_for_status()
+    result = response.json()
+    if not result.get('success'):
+        raise RuntimeError(result.get('error') or 'Unsuccessful response')
+    return result['data']['message']
+
+
+def warm_cache(questions: list, balancer, cache: AnswerCache, concurrency: int = 4,
+               timeout: float = 60, refresh: bool = False) -> dict:
+    """Fill cache with answers to questions; returns a coverage report"""
+    start = time.perf_counter()
+    todo = [q for q in questions if refresh or cache.get(q) is None]
+    skipped = len(questions) - len(todo)
+    failed = []
+    warmed = 0
+
+    print(f"🔥 Warming {len(todo)} questions ({skipped} already cached), concurrency {concurrency}")
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        futures = {executor.submit(ask, balancer, q, timeout): q for q in todo}
+        for done, future in enumerate(as_completed(futures), 1):
+            question = futures[future]
+            try:
+                cache.set(question, future.result())
+                warmed += 1
+                print(f"  [{done}/{len(todo)}] ✅ {question[:70]}")
+            except Exception as e:
+                failed.append({'question': question, 'error': str(e)})
+                print(f"  [{done}/{len(todo)}] ❌ {question[:70]} - {e}")
+
+    covered = sum(1 for q in questions if cache.get(q) is not None)
+    return {
+        'generated_at': datetime.now().isoformat(),
+        'questions': len(questions),
+        'warmed': warmed,
+        'skipped': skipped,
+        'failed': failed,
+        'coverage': round(covered / len(questions), 4) if questions else 1.0,
+        'elapsed_s': round(time.perf_counter() - start, 2),
+    }
+
+
+def main():
+    load_dotenv()
+    parser = argparse.ArgumentParser(description='Warm the answer cache from a FAQ list')
+    parser.add_argument('--faq', default=os.getenv('WARMUP_FAQ_FILE', 'faq.txt'))
+    parser.add_argument('--no-default-prompts', action='store_true', help='Skip the prompts from webhook.py')
+    parser.add_argument('--cache-file', default=os.getenv('ANSWER_CACHE_FILE', 'answer_cache.json'))
+    parser.add_argument('--concurrency', type=int, default=int(os.getenv('WARMUP_CONCURRENCY', 4)))
+    parser.add_argument('--timeout', type=float, default=60)
+    parser.add_argument('--refresh', action='store_true', help='Re-ask questions that are already cached')
+    parser.add_argument('--min-coverage', type=float, default=0.0,
+                        help='Exit non-zero if coverage is below this fraction (keeps the replica unhealthy)')
+    parser.add_argument('--interval', type=float, default=None, help='Repeat every N seconds instead of exiting')
+    parser.add_argument('--report', default=None, help='Write the coverage report as JSON to this path')
+    args = parser.parse_args()
+
+    questions = load_faq(args.faq, include_defaults=not args.no_default_prompts)
+    balancer = create_load_balancer()
+    cache = AnswerCache(max_entries=max(len(questions), int(os.getenv("ANSWER_CACHE_SIZE", 1000))))
+    cache.load(args.cache_file)
+
+    while True:
+        report = warm_cache(questions, balancer, cache, concurrency=args.concurrency,
+                            timeout=args.timeout, refresh=args.refresh)
+        cache.save(args.cache_file)
+        if args.report:
+            with open(args.report, 'w') as f:
+                json.dump(report, f, indent=2)
+
+        print(f"\n📊 Coverage {report['coverage'] * 100:.1f}% of {report['questions']} questions "
+              f"({report['warmed']} warmed, {report['skipped']} cached, {len(report['failed'])} failed) "
+              f"in {report['elapsed_s']}s")
+        print(f"💾 Cache written: {args.cache_file}")
+
+        if args.interval is None:
+            return 0 if report['coverage'] >= args.min_coverage else 1
+        # Scheduled runs re-ask everything so answers track document changes
+        args.refresh = True
+        time.sleep(args.interval)
+
+
+if __name__ == "__main__":
+    sys.exit(main())